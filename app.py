@@ -1,151 +1,509 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
-from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, session, abort, g, send_from_directory
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy.orm import joinedload, selectinload
+from werkzeug.local import LocalProxy
+from werkzeug.security import check_password_hash
+from concurrent.futures import wait
 from datetime import datetime, timedelta
 from functools import wraps
+from types import SimpleNamespace
 import os
 import json
+import mimetypes
+import base64
+import hashlib
+import threading
+import time
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-change-this-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hotel.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+import click
 
-db = SQLAlchemy(app)
+from assets import ASSET_CACHE_CONTROL, ENCODINGS, Assets
+from cache import (
+    CatalogCache, DatabaseBackend, FragmentCache, FragmentCacheExtension, TTLCache, make_backend, redis_prefix
+)
+from config import Config
+from ledger import (
+    ACTIVE_STATUSES, RoomUnavailable, apply_booking_to_ledger, create_booking, create_hold, expire_holds,
+    rebuild_booking_stats, rebuild_room_nights, record_booking_stats, release_holds, reserve_booking, stay_nights
+)
+from media import MEDIA_CACHE_CONTROL, MediaPipeline, image_set, load_media
+from models import (
+    db, create_db_app, create_tables, sync_room_amenities,
+    Admin, Booking, BookingItem, BookingStats, CacheCounter, DailyBookingStats, Room, RoomAmenity, RoomHold, RoomNight
+)
+from profiling import init_profiling
+from properties import (
+    PROPERTY_HEADER, PerProperty, current_property, init_properties, property_keys, property_label, use_property
+)
+from search import search_combinations
+from throttle import LoginThrottle, PoolBusy, make_buckets
+
+# Routes, template filters and CLI commands of the site, registered by create_app()
+bp = Blueprint('hotel', __name__, cli_group=None)
+
+def create_app(config=Config):
+    """Application factory: the website on top of create_db_app()'s database app"""
+    app = create_db_app(config, import_name=__name__)
+    if app.config['PROPERTIES']:
+        init_properties(app)
+    if app.config['PROFILING']:
+        init_profiling(app)
+    
+    # Rendered room cards and room detail bodies ({% cache %} in the templates)
+    fragment_cache = FragmentCache(app.config['FRAGMENT_CACHE_MAX_SIZE'])
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = fragment_cache if app.config['FRAGMENT_CACHE_MAX_SIZE'] else None
+    app.jinja_env.fragment_version = current_catalog_version
+    
+    # Compiled templates are kept on disk so new workers skip the Jinja compile step
+    if app.config['JINJA_BYTECODE_CACHE_DIR']:
+        os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+    
+    redis_url = app.config['CACHE_REDIS_URL']
+    buckets = make_buckets(redis_url)
+    app.extensions['hotel'] = SimpleNamespace(
+        # One catalog per property, each with its own generation counter
+        room_catalog=PerProperty(lambda key: CatalogCache(catalog_backend(app, key), load_room_catalog)),
+        fragment_cache=fragment_cache,
+        hold_sweeper=HoldSweeper(app, app.config['HOLD_SWEEP_INTERVAL_S'], app.config['HOLD_SWEEP_BATCH']),
+        template_version=template_version(app),
+        # Minified, hashed CSS/JS bundles from the last `flask build-assets`
+        assets=Assets(app.static_folder, app.config['ASSETS_ROOT']),
+        # Token buckets for login attempts and hold creation, keyed apart
+        buckets=buckets,
+        login_throttle=LoginThrottle(
+            buckets,
+            app.config['LOGIN_IP_BURST'], app.config['LOGIN_IP_PER_MINUTE'],
+            app.config['LOGIN_USER_BURST'], app.config['LOGIN_USER_PER_MINUTE'],
+            app.config['LOGIN_HASH_WORKERS'], app.config['LOGIN_HASH_QUEUE']
+        ),
+        # (property, admin id) -> (username, auth stamp), or () for a removed admin
+        admin_principals=TTLCache(app.config['ADMIN_PRINCIPAL_TTL_S']),
+        # Room images become local variants in the background; pages switch to them on the next catalog load
+        media=MediaPipeline(app, app.config['MEDIA_WORKERS'], on_ready=lambda: room_catalog.bump())
+    )
+    app.register_blueprint(bp)
+    return app
+
+def catalog_backend(app, key):
+    """Where a property's catalog generation is kept: Redis when configured, else its own database"""
+    if app.config['CACHE_REDIS_URL']:
+        return make_backend(app.config['CACHE_REDIS_URL'], prefix=redis_prefix(key))
+    # db.session runs on the property of the request or use_property() block using the catalog
+    return DatabaseBackend(db.session, CacheCounter.__table__, app.config['CATALOG_GENERATION_TTL_S'])
+
+def __getattr__(name):
+    # `gunicorn app:app`, `flask run`, asgi.py and bench.py use a default app,
+    # built on first access so importing create_app alone stays cheap
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def site():
+    """Caches and background workers of the current app (see create_app)"""
+    return current_app.extensions['hotel']
+
+# Responsive image URLs for the room templates (macros.html picture())
+@bp.app_template_global('room_image')
+def room_image(room, index=0):
+    """src, srcset and WebP srcset of a catalog room's image (see media.image_set)"""
+    if not room.images:
+        return image_set('', None)
+    index = min(index, len(room.images) - 1) if index >= 0 else max(index, -len(room.images))
+    media = getattr(room, 'media', None)
+    return image_set(room.images[index], media[index] if media else None)
+
+# CSS/JS bundle URLs for the templates (macros.html stylesheet() and script())
+@bp.app_template_global('asset_urls')
+def asset_urls(bundle):
+    return site().assets.urls(bundle)
 
 # Add custom Jinja2 filter for JSON parsing
-@app.template_filter('from_json')
+@bp.app_template_filter('from_json')
 def from_json_filter(value):
     """Convert JSON string to Python object"""
+    if isinstance(value, (list, dict)):
+        return value  # Already decoded (JSONList columns)
     try:
         return json.loads(value)
     except:
         return []
 
-# Models
-class Room(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    type = db.Column(db.String(50), nullable=False)
-    price = db.Column(db.Float, nullable=False)
-    capacity = db.Column(db.Integer, nullable=False)
-    description = db.Column(db.Text, nullable=False)
-    amenities = db.Column(db.Text, nullable=False)  # JSON string
-    images = db.Column(db.Text, nullable=False)  # JSON string of image URLs
-    videos = db.Column(db.Text)  # JSON string of video URLs
-    available = db.Column(db.Boolean, default=True)
-    total_rooms = db.Column(db.Integer, default=1)  # NEW: Total number of this room type
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    bookings = db.relationship('Booking', backref='room', lazy=True)
-    booking_items = db.relationship('BookingItem', backref='room', lazy=True)
-
-class Booking(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    guest_name = db.Column(db.String(100), nullable=False)
-    guest_email = db.Column(db.String(120), nullable=False)
-    guest_phone = db.Column(db.String(20), nullable=False)
-    check_in = db.Column(db.Date, nullable=False)
-    check_out = db.Column(db.Date, nullable=False)
-    special_requests = db.Column(db.Text)
-    total_price = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, confirmed, cancelled
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    # NEW: Relationship to booking items
-    items = db.relationship('BookingItem', backref='booking', lazy=True, cascade='all, delete-orphan')
-    
-    # Keep old room_id for backward compatibility with existing bookings
-    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=True)
-    guests = db.Column(db.Integer, nullable=True)
-
-# NEW: BookingItem model for multiple rooms per booking
-class BookingItem(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False)
-    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=False)
-    quantity = db.Column(db.Integer, default=1)  # Number of rooms of this type
-    guests = db.Column(db.Integer, nullable=False)  # Guests for this room
-    price_per_night = db.Column(db.Float, nullable=False)
-    subtotal = db.Column(db.Float, nullable=False)
-
-class Admin(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(200), nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+ADMIN_SESSION_KEYS = ('admin_id', 'admin_username', 'admin_property', 'admin_auth')
+
+def auth_stamp(password_hash):
+    """Short digest of an admin's password hash, kept in the session to end it on a password change"""
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
+def admin_principal(admin_id):
+    """(username, auth stamp) of a signed-in admin, looked up once per worker per ADMIN_PRINCIPAL_TTL_S"""
+    key = (current_property(), admin_id)
+    principal = site().admin_principals.get(key)
+    if principal is None:
+        admin = db.session.get(Admin, admin_id)
+        principal = (admin.username, auth_stamp(admin.password_hash)) if admin else ()
+        site().admin_principals.set(key, principal)
+    return principal
 
 # Admin authentication decorator
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'admin_id' not in session:
+        # Admin accounts belong to one property's database
+        if 'admin_id' not in session or session.get('admin_property') != current_property():
+            flash('Please log in to access the admin panel.', 'warning')
+            return redirect(url_for('hotel.admin_login'))
+        principal = admin_principal(session['admin_id'])
+        if not principal or principal[1] != session.get('admin_auth'):
+            # Account removed or password changed since this session signed in
+            for key in ADMIN_SESSION_KEYS:
+                session.pop(key, None)
             flash('Please log in to access the admin panel.', 'warning')
-            return redirect(url_for('admin_login'))
+            return redirect(url_for('hotel.admin_login'))
         return f(*args, **kwargs)
     return decorated_function
 
-# Helper function to check room availability
+# Room catalog cache: decoded snapshots of every Room, reloaded only after
+# add_room / edit_room / delete_room bump the catalog generation
+def load_room_catalog():
+    """Snapshot all rooms as plain objects detached from the session"""
+    rooms = Room.query.order_by(Room.id).all()
+    media = load_media(url for room in rooms for url in room.images or [])
+    return [
+        SimpleNamespace(
+            id=room.id,
+            name=room.name,
+            type=room.type,
+            price=room.price,
+            capacity=room.capacity,
+            description=room.description,
+            amenities=list(room.amenities or []),
+            images=list(room.images or []),
+            media=[media.get(url) for url in room.images or []],  # Local variants per image, None until ingested
+            videos=list(room.videos or []),
+            available=room.available,
+            total_rooms=room.total_rooms,
+            created_at=room.created_at
+        )
+        for room in rooms
+    ]
+
+# The current app's room catalog (create_app builds one per property)
+room_catalog = LocalProxy(lambda: site().room_catalog)
+
+def current_catalog_version():
+    """Catalog version for this request, looked up once however many fragments render"""
+    if 'catalog_version' not in g:
+        g.catalog_version = room_catalog.version()
+    return g.catalog_version
+
+def template_version(app):
+    """Hash of every template file, so ETags turn over when a deploy changes the markup"""
+    digest = hashlib.sha1()
+    for root, dirs, files in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+        for name in sorted(files):
+            with open(os.path.join(root, name), 'rb') as f:
+                digest.update(name.encode() + f.read())
+    return digest.hexdigest()[:16]
+
+def catalog_etag(full_path):
+    """Strong ETag for a catalog page: catalog contents, templates and the exact URL"""
+    key = f'{current_property()}|{room_catalog.version()}|{site().template_version}|{site().assets.version}|{full_path}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def catalog_cached(f):
+    """Conditional GET for views whose output depends only on the room catalog.
+    
+    Matching If-None-Match gets a 304 without rendering. Responses carry
+    CATALOG_CACHE_CONTROL so a CDN or reverse proxy can serve them too;
+    requests with pending flash messages are rendered and marked private.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        has_session = current_app.config['SESSION_COOKIE_NAME'] in request.cookies
+        if has_session and session.get('_flashes'):
+            response = current_app.make_response(f(*args, **kwargs))
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        etag = catalog_etag(request.full_path)
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = current_app.config['CATALOG_CACHE_CONTROL']
+        if not has_session and not session.modified:
+            # The templates look for flash messages in a session that is empty
+            # without a cookie; that must not add Vary: Cookie for shared caches
+            session.accessed = False
+        if current_app.config['PROPERTIES'] and g.property_source != 'host':
+            # Same URL, different property: shared caches must key on how it was chosen
+            response.vary.update(('Cookie', PROPERTY_HEADER))
+        return response
+    return decorated_function
+
+def catalog_rooms(room_type=None, amenity=None):
+    """Available rooms from the catalog cache, optionally of one type or amenity"""
+    rooms = [
+        room for room in room_catalog.rooms()
+        if room.available and (room_type is None or room.type == room_type)
+    ]
+    if amenity:
+        matching = rooms_with_amenities([amenity])
+        rooms = [room for room in rooms if room.id in matching]
+    return rooms
+
+def rooms_with_amenities(amenities):
+    """Ids of rooms offering every one of the given amenities (indexed lookup)"""
+    amenities = set(amenities)
+    if not amenities:
+        return set()
+    rows = db.session.query(RoomAmenity.room_id).filter(
+        RoomAmenity.amenity.in_(amenities)
+    ).group_by(RoomAmenity.room_id).having(
+        db.func.count(RoomAmenity.amenity) == len(amenities)
+    )
+    return {room_id for (room_id,) in rows}
+
+def bookings_with_rooms():
+    """Booking query that loads items and their rooms up front.
+    
+    Templates walk booking.items, item.room and the legacy booking.room; with
+    the lazy relationships each of those would be a query per booking.
+    """
+    return Booking.query.options(
+        selectinload(Booking.items).joinedload(BookingItem.room),
+        joinedload(Booking.room)
+    )
+
+class HoldSweeper:
+    """Background thread that releases expired holds in small batches"""
+    
+    def __init__(self, app, interval, batch_size):
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.released = 0
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='hold-sweeper', daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with self.app.app_context():
+                    for key in property_keys(self.app):
+                        with use_property(db, key):
+                            # Short transactions, so bookings never wait behind a large sweep
+                            while True:
+                                released = expire_holds(self.batch_size)
+                                self.released += released
+                                if released < self.batch_size:
+                                    break
+            except Exception:
+                self.app.logger.exception('Hold sweep failed')
+
+@bp.before_app_request
+def start_hold_sweeper():
+    # Started per worker on its first request, after any fork; tests sweep explicitly
+    if current_app.config['HOLD_SWEEP_INTERVAL_S'] > 0 and not current_app.testing:
+        site().hold_sweeper.start()
+
+def precompile_templates(app):
+    """Compile every template once so the bytecode cache is warm, returns the count"""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+@bp.cli.command('compile-templates')
+def compile_templates_command():
+    """Fill the Jinja bytecode cache before starting workers."""
+    count = precompile_templates(current_app)
+    print(f"✓ Compiled {count} templates into {current_app.config['JINJA_BYTECODE_CACHE_DIR']}")
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    """Minify, fingerprint and precompress the CSS and JavaScript bundles."""
+    assets = site().assets
+    built = assets.build()
+    for bundle, sizes in built.items():
+        compressed = ', '.join(
+            f"{encoding} {sizes[encoding] / 1024:.1f} KB" for encoding, _ in ENCODINGS if encoding in sizes
+        )
+        print(f"  {bundle} → {assets.files[bundle]}: {sizes['source'] / 1024:.1f} KB, "
+              f"minified {sizes['minified'] / 1024:.1f} KB, {compressed}")
+    print(f"✓ {len(built)} bundles built, {len(assets.files) - len(built)} up to date in {assets.root}")
+
+@bp.cli.command('ingest-media')
+@click.option('--workers', type=int, default=4, help='images processed at once')
+@click.option('--retry-failed', is_flag=True, help='try again images that failed before')
+def ingest_media_command(workers, retry_failed):
+    """Copy every room image into local storage with its resized variants."""
+    pipeline = MediaPipeline(current_app._get_current_object(), workers)
+    for key in property_keys(current_app):
+        with use_property(db, key):
+            urls = {url for room in Room.query for url in room.images or []}
+            ready = load_media(urls)
+            db.session.close()
+            futures = pipeline.submit(sorted(urls - set(ready)), key, retry_failed)
+            wait(futures)
+            if pipeline.ingested:
+                room_catalog.bump()
+        print(f"✓ {len(ready) + pipeline.ingested} of {len(urls)} room images ready, "
+              f"{pipeline.failed} failed{property_label(key)}")
+        pipeline.ingested = pipeline.failed = 0
+
+@bp.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Backfill the dashboard stats tables from existing bookings."""
+    create_tables()
+    for key in property_keys(current_app):
+        with use_property(db, key):
+            days = rebuild_booking_stats()
+        print(f"✓ Dashboard stats rebuilt ({days} days){property_label(key)}")
+
+@bp.cli.command('expire-holds')
+def expire_holds_command():
+    """Release every expired room hold (for cron when the in-process sweeper is off)."""
+    for key in property_keys(current_app):
+        total = 0
+        with use_property(db, key):
+            while True:
+                released = expire_holds(current_app.config['HOLD_SWEEP_BATCH'])
+                total += released
+                if released < current_app.config['HOLD_SWEEP_BATCH']:
+                    break
+        print(f"✓ Released {total} expired holds{property_label(key)}")
+
+@bp.cli.command('rebuild-ledger')
+def rebuild_ledger_command():
+    """Backfill the room_night ledger from existing bookings."""
+    create_tables()
+    for key in property_keys(current_app):
+        with use_property(db, key):
+            rows = rebuild_room_nights()
+        print(f"✓ Room-night ledger rebuilt ({rows} rows){property_label(key)}")
+
+# Helper functions to check room availability
+def availability_statement(room_ids, check_in, check_out, per_night=False, hold_token=None):
+    """SELECT behind get_availability_map, shared with the async APIs (asgi.py)"""
+    booked = RoomNight.booked
+    if hold_token:
+        # The guest's own hold is theirs to change, its units count as free
+        booked = booked - db.func.coalesce(db.select(db.func.sum(RoomHold.quantity)).where(
+            RoomHold.token == hold_token,
+            RoomHold.room_id == RoomNight.room_id,
+            RoomHold.check_in <= RoomNight.night,
+            RoomHold.check_out > RoomNight.night
+        ).scalar_subquery(), 0)
+    
+    if not per_night:
+        # Busiest night of the stay decides how many units are still free
+        peak = db.select(
+            RoomNight.room_id,
+            db.func.max(booked).label('booked')
+        ).where(
+            RoomNight.room_id.in_(room_ids),
+            RoomNight.night >= check_in,
+            RoomNight.night < check_out
+        ).group_by(RoomNight.room_id).subquery()
+        
+        return db.select(
+            Room.id, Room.total_rooms, db.func.coalesce(peak.c.booked, 0)
+        ).outerjoin(peak, peak.c.room_id == Room.id).where(Room.id.in_(room_ids))
+    
+    return db.select(
+        Room.id, Room.total_rooms, RoomNight.night, booked
+    ).outerjoin(RoomNight, db.and_(
+        RoomNight.room_id == Room.id,
+        RoomNight.night >= check_in,
+        RoomNight.night < check_out
+    )).where(Room.id.in_(room_ids))
+
+def availability_from_rows(rows, check_in, check_out, per_night=False):
+    """Turn availability_statement rows into get_availability_map's result"""
+    if not per_night:
+        return {room_id: max(0, (total or 0) - booked) for room_id, total, booked in rows}
+    
+    nights = stay_nights(check_in, check_out)
+    calendar = {}
+    for room_id, total, night, booked in rows:
+        if room_id not in calendar:
+            calendar[room_id] = {night: max(0, total or 0) for night in nights}
+        if night is not None:
+            calendar[room_id][night] = max(0, (total or 0) - booked)
+    
+    return {
+        room_id: {
+            'available_count': min(by_night.values()) if by_night else 0,
+            'nights': by_night
+        }
+        for room_id, by_night in calendar.items()
+    }
+
+def get_availability_map(room_ids, check_in, check_out, per_night=False, hold_token=None):
+    """Available units per room type for a stay, in a single query.
+    
+    Returns {room_id: available_count}, or with per_night=True
+    {room_id: {'available_count': n, 'nights': {night: available}}}.
+    Units of the hold hold_token are counted as available.
+    """
+    if not room_ids:
+        return {}
+    
+    rows = db.session.execute(availability_statement(room_ids, check_in, check_out, per_night, hold_token))
+    return availability_from_rows(rows, check_in, check_out, per_night)
+
 def get_available_rooms(room_id, check_in, check_out):
     """Calculate how many rooms of a type are available for given dates"""
-    room = Room.query.get(room_id)
-    if not room:
-        return 0
-    
-    # Get all overlapping bookings for this room
-    overlapping_bookings = db.session.query(
-        db.func.coalesce(db.func.sum(BookingItem.quantity), 0)
-    ).join(Booking).filter(
-        BookingItem.room_id == room_id,
-        Booking.status.in_(['pending', 'confirmed']),
-        Booking.check_in < check_out,
-        Booking.check_out > check_in
-    ).scalar()
-    
-    # Also check legacy bookings (backward compatibility)
-    legacy_bookings = Booking.query.filter(
-        Booking.room_id == room_id,
-        Booking.status.in_(['pending', 'confirmed']),
-        Booking.check_in < check_out,
-        Booking.check_out > check_in
-    ).count()
-    
-    total_booked = overlapping_bookings + legacy_bookings
-    available = room.total_rooms - total_booked
-    
-    return max(0, available)
+    return get_availability_map([room_id], check_in, check_out).get(room_id, 0)
 
 # Public Routes
-@app.route('/')
+@bp.route('/')
+@catalog_cached
 def index():
-    featured_rooms = Room.query.filter_by(available=True).limit(6).all()
+    featured_rooms = catalog_rooms()[:6]
     return render_template('index.html', rooms=featured_rooms)
 
-@app.route('/rooms')
+@bp.route('/rooms')
+@catalog_cached
 def rooms():
     room_type = request.args.get('type', 'all')
+    amenity = request.args.get('amenity')
     if room_type == 'all':
-        all_rooms = Room.query.filter_by(available=True).all()
+        all_rooms = catalog_rooms(amenity=amenity)
     else:
-        all_rooms = Room.query.filter_by(available=True, type=room_type).all()
+        all_rooms = catalog_rooms(room_type, amenity=amenity)
     
     return render_template('rooms.html', rooms=all_rooms, current_type=room_type)
 
-@app.route('/room/<int:room_id>')
+@bp.route('/room/<int:room_id>')
+@catalog_cached
 def room_detail(room_id):
-    room = Room.query.get_or_404(room_id)
-    room.amenities_list = json.loads(room.amenities)
-    room.images_list = json.loads(room.images)
-    room.videos_list = json.loads(room.videos) if room.videos else []
+    room = room_catalog.room(room_id)
+    if room is None:
+        abort(404)
     return render_template('room-detail.html', room=room)
 
 # Update the booking_select route (around line 143-147)
 
-@app.route('/booking-select')
+@bp.route('/booking-select')
 def booking_select():
     """New route for selecting multiple rooms"""
-    all_rooms = Room.query.filter_by(available=True).all()
+    all_rooms = catalog_rooms()
     
     # Convert rooms to JSON-serializable format
     rooms_data = []
@@ -158,18 +516,18 @@ def booking_select():
             'capacity': room.capacity,
             'description': room.description,
             'total_rooms': room.total_rooms,
-            'images': json.loads(room.images),
-            'amenities': json.loads(room.amenities)
+            'images': room.images,
+            'amenities': room.amenities
         })
     
     return render_template('booking-select.html', rooms=all_rooms, rooms_json=rooms_data)
 
-@app.route('/booking/<int:room_id>')
+@bp.route('/booking/<int:room_id>')
 def booking_form(room_id):
     """Single room booking - redirects to multi-room booking"""
-    return redirect(url_for('booking_select'))
+    return redirect(url_for('hotel.booking_select'))
 
-@app.route('/booking-multi')
+@bp.route('/booking-multi')
 def booking_multi():
     """Multi-room booking form"""
     # Get selected rooms from query string
@@ -182,7 +540,7 @@ def booking_multi():
             for item in rooms_param.split(','):
                 if ':' in item:
                     room_id, quantity = item.split(':')
-                    room = Room.query.get(int(room_id))
+                    room = room_catalog.room(int(room_id))
                     if room:
                         selected_rooms.append({
                             'room': room,
@@ -193,7 +551,7 @@ def booking_multi():
     
     return render_template('booking-multi.html', selected_rooms=selected_rooms)
 
-@app.route('/api/check-availability', methods=['POST'])
+@bp.route('/api/check-availability', methods=['POST'])
 def check_availability():
     data = request.json
     room_id = data.get('room_id')
@@ -209,150 +567,364 @@ def check_availability():
         'requested': quantity
     })
 
-@app.route('/book', methods=['POST'])
+# Longest window the batch availability API will expand night by night
+MAX_AVAILABILITY_NIGHTS = 366
+
+@bp.route('/api/availability', methods=['POST'])
+def batch_availability():
+    """Availability for many room types (and optionally each night) at once"""
+    data = request.get_json(silent=True) or {}
+    try:
+        check_in = datetime.strptime(data.get('check_in'), '%Y-%m-%d').date()
+        check_out = datetime.strptime(data.get('check_out'), '%Y-%m-%d').date()
+        room_ids = [int(room_id) for room_id in data.get('room_ids') or []]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'check_in and check_out must be YYYY-MM-DD, room_ids a list of ids'}), 400
+    
+    nights = (check_out - check_in).days
+    if nights <= 0 or nights > MAX_AVAILABILITY_NIGHTS:
+        return jsonify({'error': f'Stay must be between 1 and {MAX_AVAILABILITY_NIGHTS} nights'}), 400
+    
+    if not room_ids:
+        room_ids = [room.id for room in catalog_rooms()]
+    
+    per_night = bool(data.get('per_night'))
+    availability = get_availability_map(
+        room_ids, check_in, check_out, per_night=per_night, hold_token=data.get('hold_token') or None
+    )
+    
+    results = []
+    for room_id in room_ids:
+        if room_id not in availability:
+            continue
+        if per_night:
+            entry = availability[room_id]
+            results.append({
+                'room_id': room_id,
+                'available_count': entry['available_count'],
+                'nights': {night.isoformat(): count for night, count in entry['nights'].items()}
+            })
+        else:
+            results.append({'room_id': room_id, 'available_count': availability[room_id]})
+    
+    return jsonify({
+        'check_in': check_in.isoformat(),
+        'check_out': check_out.isoformat(),
+        'rooms': results
+    })
+
+# Largest party and number of rooms the combination search will plan for
+MAX_SEARCH_GUESTS = 50
+MAX_SEARCH_ROOMS = 6
+
+@bp.route('/api/search', methods=['POST'])
+def search_rooms():
+    """Ranked room combinations that are free for the stay and seat the whole party"""
+    data = request.get_json(silent=True) or {}
+    try:
+        check_in = datetime.strptime(data.get('check_in'), '%Y-%m-%d').date()
+        check_out = datetime.strptime(data.get('check_out'), '%Y-%m-%d').date()
+        guests = int(data.get('guests'))
+        max_rooms = int(data.get('max_rooms', 4))
+        limit = int(data.get('limit', 10))
+        max_price = float(data['max_price']) if data.get('max_price') is not None else None
+        amenities = [str(amenity) for amenity in data.get('amenities') or []]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'check_in and check_out must be YYYY-MM-DD, guests a number'}), 400
+    
+    nights = (check_out - check_in).days
+    if nights <= 0 or nights > MAX_AVAILABILITY_NIGHTS:
+        return jsonify({'error': f'Stay must be between 1 and {MAX_AVAILABILITY_NIGHTS} nights'}), 400
+    if not 1 <= guests <= MAX_SEARCH_GUESTS:
+        return jsonify({'error': f'guests must be between 1 and {MAX_SEARCH_GUESTS}'}), 400
+    max_rooms = min(max(max_rooms, 1), MAX_SEARCH_ROOMS)
+    limit = min(max(limit, 1), 50)
+    
+    rooms = catalog_rooms()
+    if amenities:
+        matching = rooms_with_amenities(amenities)
+        rooms = [room for room in rooms if room.id in matching]
+    # One ledger query for every candidate, the search itself runs in memory
+    available = get_availability_map([room.id for room in rooms], check_in, check_out)
+    
+    combinations = search_combinations(
+        rooms, available, guests, nights, max_rooms=max_rooms, limit=limit, max_price=max_price
+    )
+    return jsonify({
+        'check_in': check_in.isoformat(),
+        'check_out': check_out.isoformat(),
+        'nights': nights,
+        'guests': guests,
+        'combinations': [
+            {
+                'total_price': combination['total_price'],
+                'price_per_night': combination['price_per_night'],
+                'rooms_count': combination['rooms_count'],
+                'spare_beds': combination['spare_beds'],
+                'rooms': [
+                    {
+                        'room_id': item['room'].id,
+                        'name': item['room'].name,
+                        'type': item['room'].type,
+                        'capacity': item['room'].capacity,
+                        'price_per_night': item['room'].price,
+                        'quantity': item['quantity'],
+                        'guests': item['guests']
+                    }
+                    for item in combination['items']
+                ]
+            }
+            for combination in combinations
+        ]
+    })
+
+@bp.route('/api/holds', methods=['POST'])
+def create_room_hold():
+    """Hold the selected rooms while the guest completes the booking form"""
+    config = current_app.config
+    # Anyone can hold rooms, so holds per client IP are rate limited before any database work
+    retry_after = site().buckets.take(
+        f'hold:ip:{request.remote_addr or "-"}', config['HOLD_IP_BURST'], config['HOLD_IP_PER_MINUTE'] / 60
+    )
+    if retry_after:
+        return jsonify({'error': 'Too many holds requested, please try again shortly'}), 429, {
+            'Retry-After': str(int(retry_after) + 1)
+        }
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        check_in = datetime.strptime(data.get('check_in'), '%Y-%m-%d').date()
+        check_out = datetime.strptime(data.get('check_out'), '%Y-%m-%d').date()
+        quantities = {}
+        for item in data.get('rooms') or []:
+            room_id = int(item['room_id'])
+            quantities[room_id] = quantities.get(room_id, 0) + int(item['quantity'])
+    except (TypeError, ValueError, KeyError):
+        return jsonify({'error': 'check_in and check_out must be YYYY-MM-DD, rooms a list of {room_id, quantity}'}), 400
+    
+    nights = (check_out - check_in).days
+    if nights <= 0 or nights > MAX_AVAILABILITY_NIGHTS:
+        return jsonify({'error': f'Stay must be between 1 and {MAX_AVAILABILITY_NIGHTS} nights'}), 400
+    if not quantities or min(quantities.values()) < 1:
+        return jsonify({'error': 'Please select at least one room'}), 400
+    if nights > config['HOLD_MAX_NIGHTS'] or max(quantities.values()) > config['HOLD_MAX_UNITS']:
+        return jsonify({'error': f"Rooms can be held for up to {config['HOLD_MAX_NIGHTS']} nights and "
+                                 f"{config['HOLD_MAX_UNITS']} rooms of a type, book larger stays directly"}), 400
+    
+    # Live holds of this session, apart from the one being replaced
+    replace_token = data.get('hold_token')
+    live_tokens = [token for token in session.get('hold_tokens', []) if token != replace_token]
+    if live_tokens:
+        live_tokens = db.session.scalars(db.select(RoomHold.token).where(
+            RoomHold.token.in_(live_tokens), RoomHold.expires_at > datetime.utcnow()
+        ).distinct()).all()
+    if len(live_tokens) >= config['HOLD_MAX_PER_SESSION']:
+        return jsonify({'error': 'Too many rooms held already, finish or release a booking first'}), 429
+    
+    rooms_by_id = {room.id: room for room in Room.query.filter(Room.id.in_(quantities))}
+    if len(rooms_by_id) != len(quantities):
+        return jsonify({'error': 'Room not found'}), 404
+    
+    items = [{'room': rooms_by_id[room_id], 'quantity': quantity} for room_id, quantity in quantities.items()]
+    try:
+        token, expires_at = create_hold(check_in, check_out, items, replace_token=replace_token)
+    except RoomUnavailable as e:
+        db.session.rollback()
+        available = get_available_rooms(e.room.id, check_in, check_out)
+        return jsonify({
+            'error': f'Only {available} {e.room.name} available for selected dates',
+            'room_id': e.room.id,
+            'available_count': available
+        }), 409
+    
+    session['hold_tokens'] = list(live_tokens) + [token]
+    return jsonify({
+        'hold_token': token,
+        'expires_at': expires_at.isoformat() + 'Z',
+        'hold_seconds': current_app.config['HOLD_MINUTES'] * 60
+    }), 201
+
+@bp.route('/api/holds/<token>', methods=['DELETE'])
+def release_room_hold(token):
+    """Give a hold back early, e.g. when the guest goes back to change rooms"""
+    released = release_holds(RoomHold.token == token)
+    db.session.commit()
+    return jsonify({'released': released})
+
+@bp.route('/book', methods=['POST'])
 def book_room():
     try:
         # Get form data
-        guest_name = request.form.get('guest_name')
-        guest_email = request.form.get('guest_email')
-        guest_phone = request.form.get('guest_phone')
+        guest = {
+            'guest_name': request.form.get('guest_name'),
+            'guest_email': request.form.get('guest_email'),
+            'guest_phone': request.form.get('guest_phone'),
+            'special_requests': request.form.get('special_requests')
+        }
         check_in = datetime.strptime(request.form.get('check_in'), '%Y-%m-%d').date()
         check_out = datetime.strptime(request.form.get('check_out'), '%Y-%m-%d').date()
-        special_requests = request.form.get('special_requests')
-        
-        nights = (check_out - check_in).days
+        if not 0 < (check_out - check_in).days <= MAX_AVAILABILITY_NIGHTS:
+            flash(f'Stay must be between 1 and {MAX_AVAILABILITY_NIGHTS} nights', 'danger')
+            return redirect(url_for('hotel.booking_select'))
         
         # Get selected rooms data (JSON string)
         rooms_data = request.form.get('rooms_data')
         if not rooms_data:
             flash('Please select at least one room', 'danger')
-            return redirect(url_for('booking_select'))
+            return redirect(url_for('hotel.booking_select'))
         
         selected_rooms = json.loads(rooms_data)
         
-        # Validate availability for all rooms
-        total_price = 0
+        # Resolve room types; availability is enforced when inventory is claimed
         booking_items_data = []
+        room_ids = {int(item['room_id']) for item in selected_rooms}
+        rooms_by_id = {room.id: room for room in Room.query.filter(Room.id.in_(room_ids))}
         
         for item in selected_rooms:
-            room = Room.query.get(item['room_id'])
+            room = rooms_by_id.get(int(item['room_id']))
             if not room:
                 flash(f'Room not found', 'danger')
-                return redirect(url_for('booking_select'))
-            
-            available = get_available_rooms(room.id, check_in, check_out)
-            if available < item['quantity']:
-                flash(f'Only {available} {room.name} available for selected dates', 'danger')
-                return redirect(url_for('booking_select'))
+                return redirect(url_for('hotel.booking_select'))
             
-            subtotal = nights * room.price * item['quantity']
-            total_price += subtotal
+            if int(item['quantity']) < 1:
+                flash('Please select at least one room', 'danger')
+                return redirect(url_for('hotel.booking_select'))
             
             booking_items_data.append({
                 'room': room,
-                'quantity': item['quantity'],
-                'guests': item['guests'],
-                'subtotal': subtotal
+                'quantity': int(item['quantity']),
+                'guests': item['guests']
             })
         
-        # Create booking
-        booking = Booking(
-            guest_name=guest_name,
-            guest_email=guest_email,
-            guest_phone=guest_phone,
-            check_in=check_in,
-            check_out=check_out,
-            special_requests=special_requests,
-            total_price=total_price,
-            status='confirmed'
-        )
-        
-        db.session.add(booking)
-        db.session.flush()  # Get booking ID
-        
-        # Create booking items
-        for item_data in booking_items_data:
-            booking_item = BookingItem(
-                booking_id=booking.id,
-                room_id=item_data['room'].id,
-                quantity=item_data['quantity'],
-                guests=item_data['guests'],
-                price_per_night=item_data['room'].price,
-                subtotal=item_data['subtotal']
+        try:
+            booking = create_booking(
+                guest, check_in, check_out, booking_items_data, hold_token=request.form.get('hold_token')
             )
-            db.session.add(booking_item)
-        
-        db.session.commit()
+        except RoomUnavailable as e:
+            db.session.rollback()
+            available = get_available_rooms(e.room.id, check_in, check_out)
+            flash(f'Only {available} {e.room.name} available for selected dates', 'danger')
+            return redirect(url_for('hotel.booking_select'))
         
         flash('Booking confirmed successfully!', 'success')
-        return redirect(url_for('booking_success', booking_id=booking.id))
+        return redirect(url_for('hotel.booking_success', booking_id=booking.id))
     except Exception as e:
         db.session.rollback()
         flash(f'Error processing booking: {str(e)}', 'danger')
-        return redirect(url_for('booking_select'))
+        return redirect(url_for('hotel.booking_select'))
 
-@app.route('/booking-success/<int:booking_id>')
+@bp.route('/booking-success/<int:booking_id>')
 def booking_success(booking_id):
-    booking = Booking.query.get_or_404(booking_id)
+    booking = bookings_with_rooms().filter(Booking.id == booking_id).first_or_404()
     return render_template('booking-success-multi.html', booking=booking)
 
 # Admin Routes
-@app.route('/admin/login', methods=['GET', 'POST'])
+@bp.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
+        username = request.form.get('username') or ''
+        password = request.form.get('password') or ''
+        throttle = site().login_throttle
+        
+        # Per-IP and per-username token buckets, taken before any database or hash work
+        retry_after = throttle.attempt(request.remote_addr, username)
+        if retry_after:
+            flash(f'Too many login attempts. Try again in {retry_after} seconds.', 'danger')
+            return render_template('admin/login.html'), 429, {'Retry-After': str(retry_after)}
         
         admin = Admin.query.filter_by(username=username).first()
+        db.session.close()  # Hash checks take a while, don't hold a pooled connection meanwhile
+        
+        try:
+            valid = admin is not None and throttle.check_password(check_password_hash, admin.password_hash, password)
+        except PoolBusy:
+            flash('The login service is busy. Please try again in a moment.', 'warning')
+            return render_template('admin/login.html'), 503, {'Retry-After': '1'}
         
-        if admin and check_password_hash(admin.password_hash, password):
+        if valid:
             session['admin_id'] = admin.id
             session['admin_username'] = admin.username
+            session['admin_property'] = current_property()
+            session['admin_auth'] = auth_stamp(admin.password_hash)
             flash('Welcome back!', 'success')
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('hotel.admin_dashboard'))
         else:
             flash('Invalid username or password', 'danger')
     
     return render_template('admin/login.html')
 
-@app.route('/admin/logout')
+@bp.route('/admin/logout')
 def admin_logout():
-    session.pop('admin_id', None)
-    session.pop('admin_username', None)
+    for key in ADMIN_SESSION_KEYS:
+        session.pop(key, None)
     flash('You have been logged out.', 'info')
-    return redirect(url_for('admin_login'))
+    return redirect(url_for('hotel.admin_login'))
+
+# Days of booking history and nights of upcoming occupancy on the dashboard
+DASHBOARD_TREND_DAYS = 14
 
-@app.route('/admin/dashboard')
+@bp.route('/admin/dashboard')
 @admin_required
 def admin_dashboard():
-    total_rooms = Room.query.count()
-    available_rooms = Room.query.filter_by(available=True).count()
-    total_bookings = Booking.query.count()
-    pending_bookings = Booking.query.filter_by(status='pending').count()
+    catalog = room_catalog.rooms()
+    total_rooms = len(catalog)
+    available_rooms = sum(1 for room in catalog if room.available)
+    
+    stats = db.session.get(BookingStats, 1) or BookingStats(
+        total_bookings=0, pending_bookings=0, total_revenue=0
+    )
     
     # Recent bookings
-    recent_bookings = Booking.query.order_by(Booking.created_at.desc()).limit(5).all()
+    recent_bookings = Booking.query.options(joinedload(Booking.room)).order_by(
+        Booking.created_at.desc()
+    ).limit(5).all()
+    
+    # Trends: bookings made over the last days, occupancy over the coming nights
+    today = datetime.utcnow().date()
+    days = [today - timedelta(days=i) for i in range(DASHBOARD_TREND_DAYS - 1, -1, -1)]
+    daily = {row.day: row for row in DailyBookingStats.query.filter(DailyBookingStats.day >= days[0])}
+    booking_trend = [{
+        'day': day,
+        'bookings': daily[day].bookings if day in daily else 0,
+        'revenue': daily[day].revenue if day in daily else 0
+    } for day in days]
     
-    # Revenue calculation
-    total_revenue = db.session.query(db.func.sum(Booking.total_price)).filter(
-        Booking.status.in_(['confirmed', 'pending'])
-    ).scalar() or 0
+    nights = stay_nights(today, today + timedelta(days=DASHBOARD_TREND_DAYS))
+    booked = dict(db.session.query(RoomNight.night, db.func.sum(RoomNight.booked)).filter(
+        RoomNight.night >= nights[0],
+        RoomNight.night <= nights[-1]
+    ).group_by(RoomNight.night).all())
+    inventory = sum(room.total_rooms or 0 for room in catalog if room.available)
+    occupancy_trend = [{
+        'night': night,
+        'booked': booked.get(night, 0),
+        'occupancy': round(100 * booked.get(night, 0) / inventory) if inventory else 0
+    } for night in nights]
     
     return render_template('admin/dashboard.html', 
                          total_rooms=total_rooms,
                          available_rooms=available_rooms,
-                         total_bookings=total_bookings,
-                         pending_bookings=pending_bookings,
+                         total_bookings=stats.total_bookings,
+                         pending_bookings=stats.pending_bookings,
                          recent_bookings=recent_bookings,
-                         total_revenue=total_revenue)
+                         total_revenue=stats.total_revenue,
+                         booking_trend=booking_trend,
+                         occupancy_trend=occupancy_trend)
 
-@app.route('/admin/rooms')
+@bp.route('/admin/rooms')
 @admin_required
 def admin_rooms():
     all_rooms = Room.query.order_by(Room.created_at.desc()).all()
     return render_template('admin/manage-rooms.html', rooms=all_rooms)
 
-@app.route('/admin/room/add', methods=['POST'])
+def queue_room_media(urls):
+    """Have the background pipeline ingest a saved room's images that are not local yet"""
+    urls = [url for url in urls or [] if url]
+    if urls and site().media.workers:
+        ready = load_media(urls)
+        site().media.submit([url for url in urls if url not in ready], current_property())
+
+@bp.route('/admin/room/add', methods=['POST'])
 @admin_required
 def add_room():
     try:
@@ -362,23 +934,26 @@ def add_room():
             price=float(request.form.get('price')),
             capacity=int(request.form.get('capacity')),
             description=request.form.get('description'),
-            amenities=request.form.get('amenities'),
-            images=request.form.get('images'),
-            videos=request.form.get('videos', '[]'),
+            amenities=json.loads(request.form.get('amenities')),
+            images=json.loads(request.form.get('images')),
+            videos=json.loads(request.form.get('videos') or '[]'),
             available=request.form.get('available') == 'true',
             total_rooms=int(request.form.get('total_rooms', 1))
         )
+        sync_room_amenities(room)
         
         db.session.add(room)
         db.session.commit()
+        room_catalog.bump()
+        queue_room_media(room.images)
         
         flash('Room added successfully!', 'success')
     except Exception as e:
         flash(f'Error adding room: {str(e)}', 'danger')
     
-    return redirect(url_for('admin_rooms'))
+    return redirect(url_for('hotel.admin_rooms'))
 
-@app.route('/admin/room/edit/<int:room_id>', methods=['POST'])
+@bp.route('/admin/room/edit/<int:room_id>', methods=['POST'])
 @admin_required
 def edit_room(room_id):
     try:
@@ -389,21 +964,24 @@ def edit_room(room_id):
         room.price = float(request.form.get('price'))
         room.capacity = int(request.form.get('capacity'))
         room.description = request.form.get('description')
-        room.amenities = request.form.get('amenities')
-        room.images = request.form.get('images')
-        room.videos = request.form.get('videos', '[]')
+        room.amenities = json.loads(request.form.get('amenities'))
+        room.images = json.loads(request.form.get('images'))
+        room.videos = json.loads(request.form.get('videos') or '[]')
         room.available = request.form.get('available') == 'true'
         room.total_rooms = int(request.form.get('total_rooms', 1))
+        sync_room_amenities(room)
         
         db.session.commit()
+        room_catalog.bump()
+        queue_room_media(room.images)
         
         flash('Room updated successfully!', 'success')
     except Exception as e:
         flash(f'Error updating room: {str(e)}', 'danger')
     
-    return redirect(url_for('admin_rooms'))
+    return redirect(url_for('hotel.admin_rooms'))
 
-@app.route('/admin/room/delete/<int:room_id>', methods=['POST'])
+@bp.route('/admin/room/delete/<int:room_id>', methods=['POST'])
 @admin_required
 def delete_room(room_id):
     try:
@@ -423,45 +1001,175 @@ def delete_room(room_id):
         if active_bookings > 0 or active_items > 0:
             flash('Cannot delete room with active bookings!', 'warning')
         else:
+            release_holds(RoomHold.room_id == room_id)
             db.session.delete(room)
             db.session.commit()
+            room_catalog.bump()
             flash('Room deleted successfully!', 'success')
     except Exception as e:
         flash(f'Error deleting room: {str(e)}', 'danger')
     
-    return redirect(url_for('admin_rooms'))
+    return redirect(url_for('hotel.admin_rooms'))
+
+# Bookings per page (and per incremental load) in the admin booking list
+ADMIN_BOOKINGS_PAGE_SIZE = 50
+
+def encode_booking_cursor(booking):
+    """Opaque keyset cursor pointing just after a booking"""
+    raw = f'{booking.created_at.isoformat()}|{booking.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_booking_cursor(cursor):
+    """(created_at, id) from a cursor, or None if it is missing or malformed"""
+    try:
+        created_at, booking_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(booking_id)
+    except (AttributeError, ValueError):
+        return None
 
-@app.route('/admin/bookings')
+def parse_booking_filters(args):
+    """Admin booking list filters from query args, invalid values dropped"""
+    filters = {
+        'status': args.get('status', 'all'),
+        'email': (args.get('email') or '').strip(),
+        'date_from': None,
+        'date_to': None
+    }
+    for key in ('date_from', 'date_to'):
+        try:
+            filters[key] = datetime.strptime(args.get(key, ''), '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    return filters
+
+def admin_booking_page(filters, cursor=None):
+    """One page of bookings, newest first, and the cursor for the next page"""
+    query = bookings_with_rooms()
+    
+    if filters['status'] != 'all':
+        query = query.filter(Booking.status == filters['status'])
+    if filters['email']:
+        query = query.filter(Booking.guest_email.startswith(filters['email'], autoescape=True))
+    # Stays overlapping the selected date range
+    if filters['date_from']:
+        query = query.filter(Booking.check_out > filters['date_from'])
+    if filters['date_to']:
+        query = query.filter(Booking.check_in <= filters['date_to'])
+    
+    position = decode_booking_cursor(cursor) if cursor else None
+    if position:
+        query = query.filter(db.tuple_(Booking.created_at, Booking.id) < position)
+    
+    bookings = query.order_by(
+        Booking.created_at.desc(), Booking.id.desc()
+    ).limit(ADMIN_BOOKINGS_PAGE_SIZE + 1).all()
+    
+    next_cursor = None
+    if len(bookings) > ADMIN_BOOKINGS_PAGE_SIZE:
+        bookings = bookings[:ADMIN_BOOKINGS_PAGE_SIZE]
+        next_cursor = encode_booking_cursor(bookings[-1])
+    return bookings, next_cursor
+
+def serialize_booking(booking):
+    """Booking as the JSON object the admin booking list works with"""
+    data = {
+        'id': booking.id,
+        'guest_name': booking.guest_name,
+        'guest_email': booking.guest_email,
+        'guest_phone': booking.guest_phone,
+        'check_in': booking.check_in.strftime('%Y-%m-%d'),
+        'check_out': booking.check_out.strftime('%Y-%m-%d'),
+        'total_price': booking.total_price,
+        'status': booking.status,
+        'created_at': booking.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'special_requests': booking.special_requests,
+        'is_multi_room': False
+    }
+    if booking.items:
+        data['items'] = [{
+            'room_name': item.room.name,
+            'room_type': item.room.type,
+            'room_capacity': item.room.capacity,
+            'quantity': item.quantity,
+            'guests': item.guests,
+            'price_per_night': item.price_per_night,
+            'subtotal': item.subtotal
+        } for item in booking.items]
+        data['is_multi_room'] = True
+    elif booking.room:
+        data['room'] = {
+            'name': booking.room.name,
+            'type': booking.room.type,
+            'capacity': booking.room.capacity
+        }
+        data['guests'] = booking.guests or 0
+    return data
+
+@bp.route('/admin/bookings')
 @admin_required
 def admin_bookings():
-    status_filter = request.args.get('status', 'all')
+    filters = parse_booking_filters(request.args)
+    bookings, next_cursor = admin_booking_page(filters)
     
-    if status_filter == 'all':
-        all_bookings = Booking.query.order_by(Booking.created_at.desc()).all()
-    else:
-        all_bookings = Booking.query.filter_by(status=status_filter).order_by(Booking.created_at.desc()).all()
+    return render_template('admin/manage-bookings.html',
+                         bookings=bookings,
+                         bookings_data={booking.id: serialize_booking(booking) for booking in bookings},
+                         next_cursor=next_cursor,
+                         filters=filters,
+                         current_status=filters['status'])
+
+@bp.route('/admin/bookings.json')
+@admin_required
+def admin_bookings_json():
+    """Next page of the admin booking list for incremental scrolling"""
+    filters = parse_booking_filters(request.args)
+    bookings, next_cursor = admin_booking_page(filters, request.args.get('cursor'))
     
-    return render_template('admin/manage-bookings.html', bookings=all_bookings, current_status=status_filter)
+    return jsonify({
+        'bookings': [serialize_booking(booking) for booking in bookings],
+        'next_cursor': next_cursor
+    })
 
-@app.route('/admin/booking/update/<int:booking_id>', methods=['POST'])
+@bp.route('/admin/booking/update/<int:booking_id>', methods=['POST'])
 @admin_required
 def update_booking_status(booking_id):
     try:
         booking = Booking.query.get_or_404(booking_id)
+        old_status = booking.status
         booking.status = request.form.get('status')
+        was_active = old_status in ACTIVE_STATUSES
+        is_active = booking.status in ACTIVE_STATUSES
+        
+        # Release inventory, or claim it again within each night's capacity
+        if was_active and not is_active:
+            apply_booking_to_ledger(booking, -1)
+        elif is_active and not was_active:
+            try:
+                reserve_booking(booking)
+            except RoomUnavailable as e:
+                db.session.rollback()
+                flash(f'{e.room.name} is fully booked on some of these nights, '
+                      f'the booking stays {old_status}', 'danger')
+                return redirect(url_for('hotel.admin_bookings'))
+        if old_status != booking.status:
+            record_booking_stats(booking, old_status, booking.status)
         db.session.commit()
         
         flash('Booking status updated successfully!', 'success')
     except Exception as e:
+        db.session.rollback()
         flash(f'Error updating booking: {str(e)}', 'danger')
     
-    return redirect(url_for('admin_bookings'))
+    return redirect(url_for('hotel.admin_bookings'))
 
-@app.route('/admin/booking/delete/<int:booking_id>', methods=['POST'])
+@bp.route('/admin/booking/delete/<int:booking_id>', methods=['POST'])
 @admin_required
 def delete_booking(booking_id):
     try:
         booking = Booking.query.get_or_404(booking_id)
+        if booking.status in ACTIVE_STATUSES:
+            apply_booking_to_ledger(booking, -1)
+        record_booking_stats(booking, old_status=booking.status)
         db.session.delete(booking)
         db.session.commit()
         
@@ -469,23 +1177,60 @@ def delete_booking(booking_id):
     except Exception as e:
         flash(f'Error deleting booking: {str(e)}', 'danger')
     
-    return redirect(url_for('admin_bookings'))
+    return redirect(url_for('hotel.admin_bookings'))
 
-# API Routes for AJAX
-@app.route('/api/rooms')
-def api_rooms():
-    rooms = Room.query.filter_by(available=True).all()
-    return jsonify([{
+def serialize_room(room):
+    """Public JSON view of a catalog room"""
+    return {
         'id': room.id,
         'name': room.name,
         'type': room.type,
         'price': room.price,
         'capacity': room.capacity,
         'total_rooms': room.total_rooms,
-        'images': json.loads(room.images)
-    } for room in rooms])
+        'images': room.images
+    }
+
+@bp.route('/media/<digest>/<filename>')
+def media_file(digest, filename):
+    """Resized room image variant; the URL names its content, so it is cached for good"""
+    response = send_from_directory(current_app.config['MEDIA_ROOT'], f'{digest}/{filename}')
+    response.headers['Cache-Control'] = MEDIA_CACHE_CONTROL
+    return response
+
+@bp.route('/assets/<filename>')
+def asset_file(filename):
+    """Built CSS/JS bundle, precompressed when the client accepts it, cached for good"""
+    root = site().assets.root
+    for encoding, suffix in ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(root, filename + suffix)):
+            response = send_from_directory(root, filename + suffix, mimetype=mimetypes.guess_type(filename)[0])
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(root, filename)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = ASSET_CACHE_CONTROL
+    return response
+
+# API Routes for AJAX
+@bp.route('/api/rooms')
+@catalog_cached
+def api_rooms():
+    return jsonify([serialize_room(room) for room in catalog_rooms()])
+
+@bp.route('/admin/cache-stats')
+@admin_required
+def admin_cache_stats():
+    return jsonify({
+        'room_catalog': room_catalog.stats(),
+        'fragments': site().fragment_cache.stats(),
+        'login': site().login_throttle.stats(),
+        'media': site().media.stats()
+    })
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
-        db.create_all()
+        create_tables()
     app.run(debug=True, host='0.0.0.0', port=8000)
\ No newline at end of file
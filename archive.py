@@ -0,0 +1,311 @@
+"""Archival of old bookings out of the live booking tables.
+
+Usage:
+    python archive.py run [--older-than-days 365] [--batch 500] [--max-batches N] [--pause-ms 50] [--dry-run]
+                          [--property KEY]
+    python archive.py stats [--property KEY]
+
+run moves confirmed and cancelled bookings whose check-out is more than the
+given number of days ago, with their booking items, into booking_archive and
+booking_item_archive (same columns plus archived_at). The archive tables live
+in the app database, or in ARCHIVE_DATABASE_URL when it is set (for example
+sqlite:///archive.db, relative SQLite paths are in instance/ like the main
+database). With PROPERTIES set, every property database is archived in turn
+(or only the one given with --property), each into its own archive tables;
+ARCHIVE_DATABASE_URL is refused then, as properties share booking ids.
+
+Work is done in batches of one short transaction each, so bookings are never
+kept waiting on a long write lock. In the same transaction the room_night
+ledger and the dashboard stats give up the archived bookings, so both keep
+matching a rebuild from the live tables. Rows are copied to the archive
+before they are deleted and copies are idempotent, so an interrupted run is
+simply run again.
+
+stats prints live and archived booking counts and the archive's bookings
+and revenue per check-out year.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import (
+    Column, DateTime, Index, MetaData, Table, bindparam, case, create_engine, delete, extract, func, select
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+
+from config import Config
+from ledger import ACTIVE_STATUSES, stay_nights
+from models import create_db_app, db, Booking, BookingItem, BookingStats, DailyBookingStats, RoomNight
+from properties import property_label, selected_properties, use_property
+
+# Bookings that no longer change once their stay is over
+ARCHIVE_STATUSES = ('confirmed', 'cancelled')
+
+# Attempts for a batch that loses a write race with the booking routes
+BATCH_MAX_ATTEMPTS = 3
+
+archive_metadata = MetaData()
+
+
+def archive_table(table, name):
+    """Copy of a live table's columns, without foreign keys, plus archived_at"""
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+        for column in table.columns
+    ]
+    return Table(name, archive_metadata, *columns, Column('archived_at', DateTime, nullable=False))
+
+
+booking_archive = archive_table(Booking.__table__, 'booking_archive')
+booking_item_archive = archive_table(BookingItem.__table__, 'booking_item_archive')
+Index('ix_booking_archive_check_out', booking_archive.c.check_out)
+Index('ix_booking_archive_guest_email', booking_archive.c.guest_email)
+Index('ix_booking_item_archive_booking_id', booking_item_archive.c.booking_id)
+
+
+def archive_engine():
+    """Engine for ARCHIVE_DATABASE_URL, or None to archive into the app database"""
+    url = current_app.config['ARCHIVE_DATABASE_URL']
+    if not url:
+        return None
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:') \
+            and not os.path.isabs(url.database):
+        os.makedirs(current_app.instance_path, exist_ok=True)
+        url = url.set(database=os.path.join(current_app.instance_path, url.database))
+    return create_engine(url)
+
+
+def insert_archived(connection, table, rows):
+    """Insert rows, skipping ids already archived by an interrupted run"""
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        connection.execute(insert(table).on_conflict_do_nothing(), rows)
+    else:
+        archived = set(connection.execute(
+            select(table.c.id).where(table.c.id.in_([row['id'] for row in rows]))
+        ).scalars())
+        rows = [row for row in rows if row['id'] not in archived]
+        if rows:
+            connection.execute(table.insert(), rows)
+
+
+def release_ledger(bookings, items):
+    """Take the archived bookings' units out of room_night"""
+    units = {}
+    for booking in bookings:
+        if booking['status'] not in ACTIVE_STATUSES:
+            continue
+        counts = {}
+        for item in items.get(booking['id'], []):
+            counts[item['room_id']] = counts.get(item['room_id'], 0) + (item['quantity'] or 1)
+        if booking['room_id']:
+            counts[booking['room_id']] = counts.get(booking['room_id'], 0) + 1
+        for room_id, quantity in counts.items():
+            for night in stay_nights(booking['check_in'], booking['check_out']):
+                units[(room_id, night)] = units.get((room_id, night), 0) + quantity
+    if not units:
+        return
+
+    ledger = RoomNight.__table__
+    keys = (ledger.c.room_id == bindparam('b_room_id'), ledger.c.night == bindparam('b_night'))
+    rows = [{'b_room_id': room_id, 'b_night': night, 'b_units': count} for (room_id, night), count in units.items()]
+    db.session.execute(ledger.update().where(*keys).values(booked=ledger.c.booked - bindparam('b_units')), rows)
+    # Nights nobody holds any more are dropped, a rebuild would not create them
+    db.session.execute(delete(ledger).where(*keys, ledger.c.booked <= 0), rows)
+
+
+def release_stats(bookings):
+    """Take the archived bookings out of the dashboard totals and daily rollups"""
+    revenue = sum(booking['total_price'] for booking in bookings if booking['status'] in ACTIVE_STATUSES)
+    db.session.execute(BookingStats.__table__.update().where(BookingStats.id == 1).values(
+        total_bookings=BookingStats.total_bookings - len(bookings),
+        total_revenue=BookingStats.total_revenue - revenue
+    ))
+
+    daily = {}
+    for booking in bookings:
+        if booking['created_at'] is None:
+            continue
+        day = daily.setdefault(booking['created_at'].date(), [0, 0])
+        day[0] += 1
+        day[1] += booking['total_price'] if booking['status'] in ACTIVE_STATUSES else 0
+    if not daily:
+        return
+
+    rollup = DailyBookingStats.__table__
+    db.session.execute(
+        rollup.update().where(rollup.c.day == bindparam('b_day')).values(
+            bookings=rollup.c.bookings - bindparam('b_bookings'),
+            revenue=rollup.c.revenue - bindparam('b_revenue')
+        ),
+        [{'b_day': day, 'b_bookings': count, 'b_revenue': amount} for day, (count, amount) in daily.items()]
+    )
+    db.session.execute(delete(rollup).where(rollup.c.day.in_(daily), rollup.c.bookings <= 0))
+
+
+def eligible(cutoff):
+    return (Booking.status.in_(ARCHIVE_STATUSES), Booking.check_out < cutoff)
+
+
+def archive_batch(cutoff, batch_size, engine=None):
+    """Move one batch of old bookings to the archive, returns bookings moved"""
+    bookings = db.session.execute(
+        select(Booking.__table__).where(*eligible(cutoff)).limit(batch_size)
+    ).mappings().all()
+    if not bookings:
+        db.session.rollback()
+        return 0
+    booking_ids = [booking['id'] for booking in bookings]
+    item_rows = db.session.execute(
+        select(BookingItem.__table__).where(BookingItem.booking_id.in_(booking_ids))
+    ).mappings().all()
+
+    archived_at = datetime.utcnow()
+    archived_bookings = [dict(booking, archived_at=archived_at) for booking in bookings]
+    archived_items = [dict(item, archived_at=archived_at) for item in item_rows]
+    if engine is None:
+        connection = db.session.connection()
+        insert_archived(connection, booking_archive, archived_bookings)
+        insert_archived(connection, booking_item_archive, archived_items)
+    else:
+        # Committed first: a failure below leaves copies that the next run skips
+        with engine.begin() as connection:
+            insert_archived(connection, booking_archive, archived_bookings)
+            insert_archived(connection, booking_item_archive, archived_items)
+
+    items = {}
+    for item in item_rows:
+        items.setdefault(item['booking_id'], []).append(item)
+    release_ledger(bookings, items)
+    release_stats(bookings)
+    db.session.execute(delete(BookingItem.__table__).where(BookingItem.booking_id.in_(booking_ids)))
+    db.session.execute(delete(Booking.__table__).where(Booking.id.in_(booking_ids)))
+    db.session.commit()
+    return len(bookings)
+
+
+def archive_bookings(cutoff, batch_size, max_batches=None, pause=0, engine=None, progress=None):
+    """Archive eligible bookings batch by batch, returns bookings moved"""
+    archive_metadata.create_all(engine or db.session.get_bind())
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            try:
+                moved = archive_batch(cutoff, batch_size, engine)
+                break
+            except OperationalError:
+                # Lost a write race with a booking (lock timeout); the batch is retried whole
+                db.session.rollback()
+                if attempt == BATCH_MAX_ATTEMPTS - 1:
+                    raise
+                time.sleep(pause + 0.1 * (attempt + 1))
+        total += moved
+        batches += 1
+        if progress and moved:
+            progress(total)
+        if moved < batch_size:
+            break
+        time.sleep(pause)  # Lets queued booking writes in between batches
+    return total
+
+
+def shared_archive_refused(app):
+    """True (after saying why) when several property databases would share ARCHIVE_DATABASE_URL"""
+    if app.config['PROPERTIES'] and app.config['ARCHIVE_DATABASE_URL']:
+        print("❌ ARCHIVE_DATABASE_URL cannot be used with PROPERTIES: booking ids of different "
+              "properties would collide. Unset it to archive into each property database", file=sys.stderr)
+        return True
+    return False
+
+
+def run_archive(args):
+    cutoff = datetime.utcnow().date() - timedelta(days=args.older_than_days)
+    app = create_db_app()
+    with app.app_context():
+        if shared_archive_refused(app):
+            return 1
+        for key in selected_properties(app, args.property):
+            with use_property(db, key):
+                if args.dry_run:
+                    count = db.session.query(func.count(Booking.id)).filter(*eligible(cutoff)).scalar()
+                    print(f"🔎 {count} bookings checked out before {cutoff} would be archived{property_label(key)}",
+                          file=sys.stderr)
+                    continue
+
+                engine = archive_engine()
+                started = time.perf_counter()
+                total = archive_bookings(
+                    cutoff, args.batch, args.max_batches, args.pause_ms / 1000, engine,
+                    progress=lambda done: print(f"  … {done} bookings archived", file=sys.stderr)
+                )
+            target = engine.url.render_as_string(hide_password=True) if engine else 'the app database'
+            print(f"✅ Archived {total} bookings checked out before {cutoff} into {target} "
+                  f"in {time.perf_counter() - started:.1f}s{property_label(key)}", file=sys.stderr)
+    return 0
+
+
+def run_stats(args):
+    app = create_db_app()
+    with app.app_context():
+        if shared_archive_refused(app):
+            return 1
+        for key in selected_properties(app, args.property):
+            with use_property(db, key):
+                engine = archive_engine() or db.session.get_bind()
+                archive_metadata.create_all(engine)
+                live = db.session.query(func.count(Booking.id)).scalar()
+            year = extract('year', booking_archive.c.check_out)
+            active_revenue = func.sum(case(
+                (booking_archive.c.status.in_(ACTIVE_STATUSES), booking_archive.c.total_price), else_=0
+            ))
+            with engine.connect() as connection:
+                by_year = connection.execute(
+                    select(year, func.count(), active_revenue).group_by(year).order_by(year)
+                ).all()
+            if key:
+                print(f"[{key}]")
+            print(f"Live bookings: {live}")
+            print(f"Archived bookings: {sum(count for _, count, _ in by_year)}")
+            for check_out_year, count, revenue in by_year:
+                print(f"  {int(check_out_year)}: {count} bookings, revenue {revenue or 0:.2f}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Archive old bookings out of the live tables')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='move old confirmed/cancelled bookings to the archive')
+    run.add_argument('--older-than-days', type=int, default=Config.ARCHIVE_AFTER_DAYS,
+                     help='archive stays that checked out at least this many days ago')
+    run.add_argument('--batch', type=int, default=Config.ARCHIVE_BATCH_SIZE,
+                     help='bookings moved per transaction')
+    run.add_argument('--max-batches', type=int, help='stop after this many batches (default: until done)')
+    run.add_argument('--pause-ms', type=int, default=50, help='pause between batches')
+    run.add_argument('--dry-run', action='store_true', help='only count the bookings that would move')
+    run.set_defaults(handler=run_archive)
+
+    stats = commands.add_parser('stats', help='live and archived booking counts')
+    stats.set_defaults(handler=run_stats)
+
+    for command in (run, stats):
+        command.add_argument('--property', choices=sorted(Config.PROPERTIES),
+                             help='only this property (default: every property in PROPERTIES)')
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
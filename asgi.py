@@ -0,0 +1,330 @@
+"""ASGI entry point: async read-only JSON APIs, everything else served by Flask.
+
+Usage:
+    uvicorn asgi:application --workers 4
+
+POST /api/check-availability, POST /api/availability and GET /api/rooms are
+answered here by coroutines on the worker's event loop, querying through an
+async SQLAlchemy engine (aiosqlite for SQLite, asyncpg for Postgres). A burst
+of date-picker lookups then waits on the database without holding threads,
+and the Flask routes (POST /book and the pages) keep the thread pool to
+themselves. Flask runs on a pool of ASGI_FLASK_THREADS threads per worker,
+so those requests run side by side rather than one after another. Every
+lookup has a timeout (ASYNC_API_TIMEOUT_MS, 504 when it expires) and
+identical lookups already in flight share one query. With
+PROPERTIES set, each request's property is picked as in the Flask app and
+every property database gets its own async engine.
+
+Needs uvicorn, asgiref and aiosqlite from requirements.txt (asyncpg instead
+of aiosqlite for Postgres).
+"""
+import asyncio
+import inspect
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.http import parse_cookie, parse_etags, quote_etag
+
+from app import (
+    app, db, catalog_rooms, catalog_etag, serialize_room, availability_statement,
+    availability_from_rows, MAX_AVAILABILITY_NIGHTS
+)
+from properties import PROPERTY_HEADER, resolve_property, use_property
+
+# Async driver used for each sync database backend
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+
+class BadRequest(Exception):
+    pass
+
+
+class NotFound(Exception):
+    pass
+
+
+class Coalescer:
+    """Lets identical concurrent lookups share one in-flight task"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.started = 0
+        self.shared = 0
+
+    async def run(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.started += 1
+        else:
+            self.shared += 1
+        # Shielded so one caller timing out does not cancel the others' query
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Retrieved, so callers that gave up do not log it as lost
+
+
+class AsyncDatabase:
+    """Async engine per property database, each created on first use"""
+
+    def __init__(self):
+        self._engines = {}
+        self._sessions = {}
+
+    def session(self, key=None):
+        if key not in self._engines:
+            with app.app_context():
+                url = db.engines[key].url  # Relative SQLite paths resolved like the sync engine
+            self._engines[key] = create_async_engine(
+                url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()]),
+                **app.config['SQLALCHEMY_ENGINE_OPTIONS']
+            )
+            self._sessions[key] = async_sessionmaker(self._engines[key])
+        return self._sessions[key]()
+
+    async def dispose(self):
+        for engine in self._engines.values():
+            await engine.dispose()
+
+
+database = AsyncDatabase()
+coalescer = Coalescer()
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise BadRequest('check_in and check_out must be YYYY-MM-DD')
+
+
+def parse_stay(data):
+    check_in, check_out = parse_date(data.get('check_in')), parse_date(data.get('check_out'))
+    nights = (check_out - check_in).days
+    if nights <= 0 or nights > MAX_AVAILABILITY_NIGHTS:
+        raise BadRequest(f'Stay must be between 1 and {MAX_AVAILABILITY_NIGHTS} nights')
+    return check_in, check_out
+
+
+def scope_property(scope):
+    """(property key, source) of a request, chosen like the Flask app does; (None, None) when single"""
+    if not app.config['PROPERTIES']:
+        return None, None
+    headers = dict(scope['headers'])
+    requested = parse_qs(scope.get('query_string', b'').decode()).get('property', [None])[0] \
+        or headers.get(PROPERTY_HEADER.lower().encode(), b'').decode()
+
+    def remembered():
+        cookie = parse_cookie(headers.get(b'cookie', b'').decode()).get(app.config['SESSION_COOKIE_NAME'])
+        if not cookie:
+            return None
+        try:
+            return app.session_interface.get_signing_serializer(app).loads(cookie).get('property')
+        except Exception:
+            return None  # Tampered or expired cookie, as if there were none
+
+    key, source = resolve_property(app.config, headers.get(b'host', b'').decode(), requested, remembered)
+    if key is None:
+        raise NotFound('Unknown property')
+    return key, source
+
+
+def catalog_snapshot(key):
+    """Catalog rooms; runs in a thread since a cache miss reloads through the sync session"""
+    with app.app_context(), use_property(db, key):
+        return catalog_rooms()
+
+
+def catalog_snapshot_etag(key, full_path):
+    with app.app_context(), use_property(db, key):
+        return catalog_etag(full_path)
+
+
+async def availability(key, room_ids, check_in, check_out, per_night=False, hold_token=None):
+    """get_availability_map on a property's database, coalesced and with a timeout"""
+    room_ids = tuple(sorted(set(room_ids)))
+    if not room_ids:
+        return {}
+
+    async def lookup():
+        async with database.session(key) as session:
+            result = await session.execute(
+                availability_statement(room_ids, check_in, check_out, per_night, hold_token)
+            )
+            rows = result.all()
+        return availability_from_rows(rows, check_in, check_out, per_night)
+
+    timeout = app.config['ASYNC_API_TIMEOUT_MS'] / 1000
+    lookup_key = (key, room_ids, check_in, check_out, per_night, hold_token)
+    return await asyncio.wait_for(coalescer.run(lookup_key, lookup), timeout)
+
+
+async def check_availability(scope, data):
+    try:
+        room_id = int(data.get('room_id'))
+        quantity = int(data.get('quantity', 1))
+    except (TypeError, ValueError):
+        raise BadRequest('room_id and quantity must be integers')
+    check_in, check_out = parse_stay(data)
+    key, _ = scope_property(scope)
+
+    available = (await availability(key, [room_id], check_in, check_out)).get(room_id, 0)
+    return 200, {
+        'available': available >= quantity,
+        'available_count': available,
+        'requested': quantity
+    }, []
+
+
+async def batch_availability(scope, data):
+    check_in, check_out = parse_stay(data)
+    try:
+        room_ids = [int(room_id) for room_id in data.get('room_ids') or []]
+    except (TypeError, ValueError):
+        raise BadRequest('room_ids must be a list of ids')
+    key, _ = scope_property(scope)
+    if not room_ids:
+        room_ids = [room.id for room in await asyncio.to_thread(catalog_snapshot, key)]
+
+    per_night = bool(data.get('per_night'))
+    found = await availability(key, room_ids, check_in, check_out, per_night, data.get('hold_token') or None)
+
+    results = []
+    for room_id in room_ids:
+        if room_id not in found:
+            continue
+        if per_night:
+            results.append({
+                'room_id': room_id,
+                'available_count': found[room_id]['available_count'],
+                'nights': {night.isoformat(): count for night, count in found[room_id]['nights'].items()}
+            })
+        else:
+            results.append({'room_id': room_id, 'available_count': found[room_id]})
+    return 200, {'check_in': check_in.isoformat(), 'check_out': check_out.isoformat(), 'rooms': results}, []
+
+
+async def api_rooms(scope, data):
+    """Same ETag and Cache-Control as the Flask view, 304 without a body on a match"""
+    full_path = scope['path'] + '?' + scope.get('query_string', b'').decode()
+    key, source = scope_property(scope)
+    etag = await asyncio.to_thread(catalog_snapshot_etag, key, full_path)
+    headers = [
+        (b'etag', quote_etag(etag).encode()),
+        (b'cache-control', app.config['CATALOG_CACHE_CONTROL'].encode())
+    ]
+    if source not in (None, 'host'):
+        headers.append((b'vary', f'Cookie, {PROPERTY_HEADER}'.encode()))
+    if_none_match = dict(scope['headers']).get(b'if-none-match', b'').decode()
+    if if_none_match and parse_etags(if_none_match).contains(etag):
+        return 304, None, headers
+
+    rooms = await asyncio.to_thread(catalog_snapshot, key)
+    return 200, [serialize_room(room) for room in rooms], headers
+
+
+ROUTES = {
+    ('POST', '/api/check-availability'): check_availability,
+    ('POST', '/api/availability'): batch_availability,
+    ('GET', '/api/rooms'): api_rooms,
+}
+
+class PooledWsgiInstance(WsgiToAsgiInstance):
+    """One request through the WSGI app, run on the adapter's thread pool"""
+
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        # asgiref's own version is thread-sensitive: every request of the
+        # process would run on one shared thread, one after another
+        run = inspect.unwrap(WsgiToAsgiInstance.run_wsgi_app)
+        await sync_to_async(run, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi with requests spread over a fixed pool of threads"""
+
+    def __init__(self, wsgi_application, threads):
+        super().__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='flask')
+
+    async def __call__(self, scope, receive, send):
+        await PooledWsgiInstance(self.wsgi_application, self.executor)(scope, receive, send)
+
+
+flask_application = PooledWsgiToAsgi(app, app.config['ASGI_FLASK_THREADS'])
+
+
+async def read_json(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    if not body:
+        return {}
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise BadRequest('Request body must be JSON')
+    if not isinstance(data, dict):
+        raise BadRequest('Request body must be a JSON object')
+    return data
+
+
+async def send_json(send, status, payload, headers=()):
+    body = b'' if payload is None else json.dumps(payload).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            *headers
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await database.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    handler = ROUTES.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+    if handler is None:
+        return await flask_application(scope, receive, send)
+
+    headers = []
+    try:
+        status, payload, headers = await handler(scope, await read_json(receive))
+    except BadRequest as e:
+        status, payload = 400, {'error': str(e)}
+    except NotFound as e:
+        status, payload = 404, {'error': str(e)}
+    except asyncio.TimeoutError:
+        status, payload = 504, {'error': 'Availability lookup timed out'}
+    await send_json(send, status, payload, headers)
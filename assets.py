@@ -0,0 +1,163 @@
+"""CSS and JavaScript bundles: minified, content-hashed and precompressed.
+
+Each bundle in BUNDLES is one or more files under static/, joined in order.
+`flask build-assets` (and serve.py, before forking workers) writes every
+bundle to ASSETS_ROOT as <name>.<hash>.<ext> together with .gz and, when
+the brotli package is installed, .br copies, and records the file names in
+manifest.json. Templates link bundles through the stylesheet() and script()
+macros, which emit the hashed URLs under /assets/.
+
+A bundle's URL changes whenever its contents do, so it is served with a
+one-year immutable Cache-Control and browsers never revalidate it. Nginx
+can serve the directory itself, precompressed copies included (gzip_static,
+brotli_static). Minifying needs rcssmin and rjsmin and brotli copies need
+brotli (all in requirements.txt); without them CSS only loses comments and
+indentation, JavaScript is left as is and only gzip copies are written.
+
+A bundle whose sources changed since the last build, or any bundle in
+debug mode, is linked as its original static files instead.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from flask import current_app, url_for
+
+# Cache-Control of built bundles, their URLs change whenever their contents would
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Bundle name -> source files under the static folder, joined in this order
+BUNDLES = {
+    'main.css': ['css/main.css'],
+    'admin.css': ['css/admin.css'],
+    'main.js': ['js/main.js'],
+    'booking.js': ['js/main.js', 'js/booking.js'],  # booking.html loads it instead of main.js
+    'admin.js': ['js/admin.js']
+}
+
+# Precompressed copies: Content-Encoding, file suffix
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Strings are kept as they are; comments go, and so does the whitespace around lines
+CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')|/\*.*?\*/|[ \t]*\n\s*''', re.S)
+
+
+def minify_css(source):
+    try:
+        from rcssmin import cssmin  # optional dependency, full minification
+    except ImportError:
+        return CSS_TOKENS.sub(
+            lambda match: match.group(1) or ('' if match.group(0).startswith('/*') else '\n'), source
+        ).strip()
+    return cssmin(source)
+
+
+def minify_js(source):
+    try:
+        from rjsmin import jsmin  # optional dependency; JavaScript is not safe to trim by regex
+    except ImportError:
+        return source
+    return jsmin(source)
+
+
+def compress(data, encoding):
+    """data compressed for a Content-Encoding, or None when that needs a missing package"""
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)  # mtime 0: same bytes on every build
+    try:
+        import brotli  # optional dependency, brotli copies are skipped without it
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+class Assets:
+    """The bundles of one static folder and their built copies in root"""
+
+    def __init__(self, static_folder, root):
+        self.static_folder = static_folder
+        self.root = root
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.files = {}  # bundle -> built file name, for bundles whose sources are unchanged
+        self.version = ''
+        self.load()
+
+    def source_digest(self, bundle):
+        digest = hashlib.sha256()
+        for path in BUNDLES[bundle]:
+            with open(os.path.join(self.static_folder, path), 'rb') as f:
+                digest.update(path.encode() + b'\0' + f.read())
+        return digest.hexdigest()[:16]
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self):
+        """Read manifest.json, keeping the bundles built from the current sources"""
+        manifest = self.read_manifest()
+        self.files = {
+            bundle: entry['file'] for bundle, entry in manifest.items()
+            if bundle in BUNDLES and entry.get('sources') == self.source_digest(bundle)
+            and os.path.exists(os.path.join(self.root, entry['file']))
+        }
+        self.version = hashlib.sha1(json.dumps(sorted(self.files.items())).encode()).hexdigest()[:16]
+        return self.files
+
+    def build(self):
+        """Write every bundle whose sources changed since the last build, returns their sizes.
+
+        Files of earlier builds are left in place: pages cached before a
+        deploy keep working until they expire.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        manifest = self.read_manifest()
+        built = {}
+        for bundle, paths in BUNDLES.items():
+            sources = self.source_digest(bundle)
+            entry = manifest.get(bundle)
+            if entry and entry.get('sources') == sources and os.path.exists(os.path.join(self.root, entry['file'])):
+                continue
+            texts = []
+            for path in paths:
+                with open(os.path.join(self.static_folder, path), encoding='utf-8') as f:
+                    texts.append(f.read())
+            name, extension = os.path.splitext(bundle)
+            if extension == '.css':
+                data = '\n'.join(minify_css(text) for text in texts).encode()
+            else:
+                # A file without a trailing semicolon must not run into the next one
+                data = '\n;'.join(minify_js(text) for text in texts).encode()
+            filename = f'{name}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+            sizes = {'source': sum(len(text.encode()) for text in texts), 'minified': len(data)}
+            self._write(filename, data)
+            for encoding, suffix in ENCODINGS:
+                compressed = compress(data, encoding)
+                if compressed is not None and len(compressed) < len(data):
+                    self._write(filename + suffix, compressed)
+                    sizes[encoding] = len(compressed)
+            manifest[bundle] = {'file': filename, 'sources': sources}
+            built[bundle] = sizes
+        if built:
+            self._write('manifest.json', json.dumps(manifest, indent=2, sort_keys=True).encode())
+        self.load()
+        return built
+
+    def _write(self, filename, data):
+        # Written aside and renamed, so a file is never served half-written
+        path = os.path.join(self.root, filename)
+        partial = f'{path}.{os.getpid()}.part'
+        with open(partial, 'wb') as f:
+            f.write(data)
+        os.replace(partial, path)
+
+    def urls(self, bundle):
+        """URLs to link for a bundle: its built file, or its sources when unbuilt or in debug mode"""
+        if bundle in self.files and not current_app.debug:
+            return [url_for('hotel.asset_file', filename=self.files[bundle])]
+        return [url_for('static', filename=path) for path in BUNDLES[bundle]]
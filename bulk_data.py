@@ -0,0 +1,252 @@
+"""Bulk import and export of rooms, bookings and booking items.
+
+Usage:
+    python bulk_data.py export TABLE [--output FILE] [--format csv|jsonl] [--chunk 1000] [--property KEY]
+    python bulk_data.py import TABLE [--input FILE] [--format csv|jsonl] [--chunk 1000] [--no-rebuild]
+                                     [--property KEY]
+
+TABLE is one of rooms, bookings or booking_items. Admin accounts are left out
+on purpose: their password hashes must not end up in export files. The
+format is taken from the file extension (.csv / .jsonl) unless --format is
+given; without a file rows go to stdout / come from stdin as JSONL.
+
+Export streams rows through a server-side cursor and import inserts them in
+chunks with executemany, so memory stays flat however large the file is.
+Imports run in one transaction. Import in dependency order (rooms, bookings,
+booking_items); after bookings or booking items the room_night ledger and
+the dashboard stats are rebuilt unless --no-rebuild is given. Importing
+rooms bumps the catalog generation (in the import transaction, or in Redis
+with CACHE_REDIS_URL), so running workers reload the catalog.
+
+With PROPERTIES set, --property picks the property database to work on and
+is required: one file holds the rows of one property.
+"""
+import argparse
+import csv
+import json
+import sys
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from cache import CatalogCache, bump_counter, make_backend, redis_prefix
+from config import Config
+from ledger import rebuild_room_nights, rebuild_booking_stats
+from models import create_db_app, db, CacheCounter, Room, RoomAmenity, Booking, BookingItem, JSONList
+from properties import property_label, use_property
+
+TABLES = {
+    'rooms': Room.__table__,
+    'bookings': Booking.__table__,
+    'booking_items': BookingItem.__table__
+}
+
+# Tables whose rows feed the room_night ledger and dashboard stats
+LEDGER_TABLES = {'bookings', 'booking_items'}
+
+DEFAULT_CHUNK = 1000
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'csv' if path and path.endswith('.csv') else 'jsonl'
+
+
+def encode_value(value):
+    """Plain JSON/CSV value for a column value"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def decode_value(column, value):
+    """Column value from a CSV string or decoded JSON value"""
+    if value is None or (value == '' and column.nullable):
+        return None  # CSV writes NULL as an empty cell
+    if isinstance(column.type, JSONList):
+        return value  # Binds both JSON text and lists
+    python_type = column.type.python_type
+    if isinstance(value, str) and python_type is not str:
+        value = value.strip()
+        if value == '':
+            return None
+        if python_type is bool:
+            return value.lower() in ('1', 'true', 'yes', 'y')
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        if python_type is date:
+            return date.fromisoformat(value)
+    if python_type in (int, float) and not isinstance(value, bool):
+        return python_type(value)
+    return value
+
+
+def export_rows(name, stream, fmt='jsonl', chunk=DEFAULT_CHUNK):
+    """Write every row of a table to stream, returns row count"""
+    table = TABLES[name]
+    columns = [column.name for column in table.columns]
+    rows = db.session.execute(
+        select(table).order_by(*table.primary_key.columns).execution_options(yield_per=chunk)
+    )
+
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(columns)
+
+    count = 0
+    for row in rows:
+        values = [encode_value(value) for value in row]
+        if writer:
+            writer.writerow([json.dumps(value) if isinstance(value, list) else value for value in values])
+        else:
+            stream.write(json.dumps(dict(zip(columns, values))) + '\n')
+        count += 1
+    return count
+
+
+def read_rows(stream, fmt):
+    """Yield raw row dicts from a CSV or JSONL stream"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def import_rows(name, stream, fmt='jsonl', chunk=DEFAULT_CHUNK):
+    """Insert rows from stream into a table in chunks, returns row count.
+
+    The caller commits. Rows are bound through Core, so nothing accumulates
+    in the session identity map.
+    """
+    table = TABLES[name]
+    chunk_rows = []
+    count = 0
+
+    def flush():
+        db.session.execute(table.insert(), chunk_rows)
+        chunk_rows.clear()
+
+    for raw in read_rows(stream, fmt):
+        unknown = set(raw) - set(table.columns.keys())
+        if unknown:
+            raise ValueError(f"Unknown {name} columns: {', '.join(sorted(unknown))}")
+        row = {key: decode_value(table.columns[key], value) for key, value in raw.items()}
+
+        # One executemany needs the same keys in every row
+        if chunk_rows and (len(chunk_rows) >= chunk or row.keys() != chunk_rows[0].keys()):
+            flush()
+        chunk_rows.append(row)
+        count += 1
+    if chunk_rows:
+        flush()
+
+    if name == 'rooms':
+        backfill_room_amenities(chunk)
+        if not current_app.config['CACHE_REDIS_URL']:
+            bump_counter(db.session, CacheCounter.__table__, CatalogCache.GENERATION_KEY)
+    if 'id' in table.columns and db.session.get_bind().dialect.name == 'postgresql':
+        # Explicit ids do not advance the serial sequence
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+        ))
+    return count
+
+
+def backfill_room_amenities(chunk=DEFAULT_CHUNK):
+    """Create room_amenity rows for rooms that have none yet"""
+    rooms = db.session.execute(
+        select(Room.id, Room.amenities).where(~Room.amenity_rows.any())
+    ).all()
+    rows = [
+        {'room_id': room_id, 'amenity': amenity}
+        for room_id, amenities in rooms
+        for amenity in {str(amenity)[:100] for amenity in amenities or []}
+    ]
+    for start in range(0, len(rows), chunk):
+        db.session.execute(RoomAmenity.__table__.insert(), rows[start:start + chunk])
+
+
+def open_stream(path, mode):
+    if not path or path == '-':
+        return sys.stdout if mode == 'w' else sys.stdin
+    return open(path, mode, newline='', encoding='utf-8')
+
+
+def run_export(args):
+    fmt = detect_format(args.output, args.format)
+    with create_db_app().app_context(), use_property(db, args.property):
+        stream = open_stream(args.output, 'w')
+        try:
+            count = export_rows(args.table, stream, fmt, args.chunk)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+    print(f"📦 Exported {count} {args.table} as {fmt}{property_label(args.property)}", file=sys.stderr)
+    return 0
+
+
+def run_import(args):
+    fmt = detect_format(args.input, args.format)
+    with create_db_app().app_context(), use_property(db, args.property):
+        db.metadata.create_all(db.session.get_bind())
+        stream = open_stream(args.input, 'r')
+        try:
+            count = import_rows(args.table, stream, fmt, args.chunk)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Import failed, nothing was written: {e}", file=sys.stderr)
+            return 1
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        print(f"✅ Imported {count} {args.table}{property_label(args.property)}", file=sys.stderr)
+
+        redis_url = current_app.config['CACHE_REDIS_URL']
+        if args.table == 'rooms' and redis_url:
+            make_backend(redis_url, redis_prefix(args.property)).incr(CatalogCache.GENERATION_KEY)
+
+        if args.table in LEDGER_TABLES and not args.no_rebuild:
+            nights = rebuild_room_nights()
+            days = rebuild_booking_stats()
+            print(f"✓ room_night ledger rebuilt ({nights} rows), dashboard stats rebuilt ({days} days)",
+                  file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import/export for the hotel database')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='stream a table to CSV or JSONL')
+    export.add_argument('table', choices=sorted(TABLES))
+    export.add_argument('--output', '-o', help='file to write (default stdout)')
+    export.add_argument('--format', choices=('csv', 'jsonl'))
+    export.add_argument('--chunk', type=int, default=DEFAULT_CHUNK, help='rows fetched per round trip')
+    export.set_defaults(handler=run_export)
+
+    load = commands.add_parser('import', help='bulk insert a CSV or JSONL file into a table')
+    load.add_argument('table', choices=sorted(TABLES))
+    load.add_argument('--input', '-i', help='file to read (default stdin)')
+    load.add_argument('--format', choices=('csv', 'jsonl'))
+    load.add_argument('--chunk', type=int, default=DEFAULT_CHUNK, help='rows per INSERT batch')
+    load.add_argument('--no-rebuild', action='store_true',
+                      help='skip the ledger/stats rebuild after importing bookings')
+    load.set_defaults(handler=run_import)
+
+    for command in (export, load):
+        command.add_argument('--property', choices=sorted(Config.PROPERTIES), required=bool(Config.PROPERTIES),
+                             help='property database to use (required when PROPERTIES is set)')
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
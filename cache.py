@@ -0,0 +1,296 @@
+"""In-process caches and the state backend used to invalidate them.
+
+Each worker keeps its own decoded copy of the room catalog. Copies are
+versioned by a catalog generation counter that the admin room routes bump.
+The counter lives in the database (cache_counter table), which each worker
+reads at most once per CATALOG_GENERATION_TTL_S, so a change made through
+one worker reaches every other worker within that time. With CACHE_REDIS_URL
+set it is kept in Redis instead and read on every request.
+
+Rendered template fragments are cached per worker too, keyed by the catalog
+version, so they turn over with the catalog and never need invalidating.
+Small lookups that may be a little stale (the signed-in admin) are kept in a
+TTLCache.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+
+class LocalBackend:
+    """Counters and values kept in this process only"""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def set(self, key, value, ttl=None):
+        self._values[key] = value
+
+    def incr(self, key):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + 1
+            return self._values[key]
+
+
+class RedisBackend:
+    """Counters and values shared by every worker through Redis"""
+
+    def __init__(self, url, prefix='hotel:'):
+        import redis  # optional dependency, only needed for a shared backend
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key, default=None):
+        value = self._client.get(self._prefix + key)
+        return default if value is None else value.decode()
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self._prefix + key, value, ex=ttl)
+
+    def incr(self, key):
+        return self._client.incr(self._prefix + key)
+
+
+class DatabaseBackend:
+    """Counters in a database table (key, value), shared by every worker without Redis.
+
+    A value read from the table is trusted for ttl seconds, so each worker
+    queries it at most once per ttl; its own increments are seen at once.
+    """
+
+    def __init__(self, session, table, ttl):
+        self.session = session
+        self.table = table
+        self.ttl = ttl
+        self._read = {}  # key -> (value, monotonic time read)
+
+    def get(self, key, default=None):
+        value, read_at = self._read.get(key, (None, None))
+        now = time.monotonic()
+        if read_at is None or now - read_at >= self.ttl:
+            value = self.session.execute(select(self.table.c.value).where(self.table.c.key == key)).scalar()
+            self._read[key] = (value, now)
+        return default if value is None else value
+
+    def incr(self, key):
+        """Add one in its own transaction; call with no other changes pending"""
+        table = self.table
+        try:
+            updated = self.session.execute(
+                update(table).where(table.c.key == key).values(value=table.c.value + 1)
+            ).rowcount
+            if not updated:
+                self.session.execute(insert(table).values(key=key, value=1))
+            self.session.commit()
+        except IntegrityError:
+            # Another worker inserted the row first
+            self.session.rollback()
+            self.session.execute(update(table).where(table.c.key == key).values(value=table.c.value + 1))
+            self.session.commit()
+        value = self.session.execute(select(table.c.value).where(table.c.key == key)).scalar()
+        self._read[key] = (value, time.monotonic())
+        return value
+
+
+def bump_counter(session, table, key):
+    """Add one to a counter of a DatabaseBackend table in the session's transaction, the caller commits"""
+    updated = session.execute(update(table).where(table.c.key == key).values(value=table.c.value + 1)).rowcount
+    if not updated:
+        try:
+            with session.begin_nested():
+                session.execute(insert(table).values(key=key, value=1))
+        except IntegrityError:
+            # Another worker inserted the row first
+            session.execute(update(table).where(table.c.key == key).values(value=table.c.value + 1))
+
+
+def redis_prefix(property_key=None):
+    """Redis key prefix of a property's counters"""
+    return f'hotel:{property_key}:' if property_key else 'hotel:'
+
+
+def make_backend(redis_url=None, prefix='hotel:'):
+    """Shared Redis backend when a URL is configured, else process-local"""
+    if redis_url:
+        return RedisBackend(redis_url, prefix)
+    return LocalBackend()
+
+
+class CatalogCache:
+    """Decoded room catalog, reloaded whenever the catalog generation moves"""
+
+    GENERATION_KEY = 'catalog:generation'
+
+    def __init__(self, backend, loader):
+        self.backend = backend
+        self.loader = loader
+        self.hits = 0
+        self.misses = 0
+        self._entry = None  # (generation, rooms, rooms_by_id, fingerprint)
+        self._lock = threading.Lock()
+
+    def generation(self):
+        return int(self.backend.get(self.GENERATION_KEY, 0) or 0)
+
+    def bump(self):
+        """Invalidate every worker's copy; call after committing a room change"""
+        return self.backend.incr(self.GENERATION_KEY)
+
+    def _load(self):
+        generation = self.generation()
+        entry = self._entry
+        if entry is not None and entry[0] == generation:
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        # Store under the generation read before loading, so a concurrent bump
+        # makes the next request reload rather than keep stale rows
+        rooms = self.loader()
+        fingerprint = hashlib.sha1(repr(rooms).encode()).hexdigest()[:16]
+        entry = (generation, rooms, {room.id: room for room in rooms}, fingerprint)
+        with self._lock:
+            self.misses += 1
+            self._entry = entry
+        return entry
+
+    def rooms(self):
+        return self._load()[1]
+
+    def room(self, room_id):
+        return self._load()[2].get(room_id)
+
+    def version(self):
+        """Hash of the current catalog contents, equal in every worker holding the same rows"""
+        return self._load()[3]
+
+    def stats(self):
+        entry = self._entry
+        return {
+            'generation': self.generation(),
+            'cached_generation': entry[0] if entry else None,
+            'cached_version': entry[3] if entry else None,
+            'cached_rooms': len(entry[1]) if entry else 0,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class TTLCache:
+    """Values kept for ttl seconds, the least recently stored dropped past max_size"""
+
+    def __init__(self, ttl, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._values = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        entry = self._values.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return default
+        return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._values.pop(key, None)
+            self._values[key] = (time.monotonic() + self.ttl, value)
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+
+class FragmentCache:
+    """LRU of rendered markup, capped by total characters held"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            markup = self._entries.get(key)
+            if markup is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return markup
+
+    def set(self, key, markup):
+        if len(markup) > self.max_size:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = markup
+            self.size += len(markup)
+            while self.size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'size': self.size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache key, ... %}...{% endcache %} in templates.
+
+    The rendered body is stored in environment.fragment_cache under the
+    template call site, the given key values and environment.fragment_version().
+    Caching is skipped while templates auto-reload (debug mode).
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None, fragment_version=lambda: None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [nodes.Const(f'{parser.name}:{lineno}'), parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render', [nodes.List(key)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None or self.environment.auto_reload:
+            return caller()
+        key = (self.environment.fragment_version(), *key)
+        markup = cache.get(key)
+        if markup is None:
+            markup = caller()
+            cache.set(key, markup)
+        return markup
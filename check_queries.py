@@ -0,0 +1,218 @@
+"""Query budget and query plan check for every route in app.py.
+
+Seeds a throwaway database with enough bookings that a per-row lazy load
+would blow any budget, calls each route and counts the SQL statements it
+runs. Exits non-zero if a route goes over its budget or if a route exists
+without one, so new endpoints have to declare their cost.
+
+The statements issued by the hot routes (availability, admin booking list,
+dashboard) are then run through EXPLAIN QUERY PLAN; any plan that reads a
+booking table without an index is reported as a full table scan and fails
+the check.
+
+Usage:
+    python check_queries.py [--bookings 40]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from bench import load_app, seed_rooms
+
+# Routes that never touch the database from app code
+EXEMPT_ENDPOINTS = {'static'}
+
+# Routes whose statements must never fall back to a full table scan
+HOT_ENDPOINTS = {
+    'check_availability', 'batch_availability', 'search_rooms', 'create_room_hold', 'release_room_hold',
+    'book_room', 'booking_success',
+    'admin_dashboard', 'admin_bookings', 'admin_bookings_json'
+}
+
+# Tables that grow with booking history
+BOOKING_TABLES = ('booking', 'booking_item', 'room_night')
+
+
+def route_checks(room_ids, booking_ids, spare_room_id):
+    """(endpoint, method, path, request kwargs, max statements) per route"""
+    stay = {
+        'check_in': (date.today() + timedelta(days=40)).isoformat(),
+        'check_out': (date.today() + timedelta(days=43)).isoformat()
+    }
+    room_form = {
+        'name': 'Budget Room', 'type': 'Suite', 'price': '150', 'capacity': '2',
+        'description': 'Query budget room', 'amenities': '["WiFi", "TV"]',
+        'images': '[]', 'videos': '[]', 'available': 'true', 'total_rooms': '2'
+    }
+    booking_form = {
+        'guest_name': 'Budget Guest', 'guest_email': 'budget@example.com',
+        'guest_phone': '5550000000', **stay,
+        'rooms_data': json.dumps([{'room_id': room_ids[0], 'quantity': 1, 'guests': 2}])
+    }
+    first, second = booking_ids[0], booking_ids[1]
+    return [
+        # First catalog page also reads the catalog generation, then trusted for CATALOG_GENERATION_TTL_S
+        ('index', 'GET', '/', {}, 2),
+        ('rooms', 'GET', '/rooms?type=all&amenity=WiFi', {}, 2),
+        ('room_detail', 'GET', f'/room/{room_ids[0]}', {}, 1),
+        ('booking_select', 'GET', '/booking-select', {}, 1),
+        ('booking_form', 'GET', f'/booking/{room_ids[0]}', {}, 0),
+        ('booking_multi', 'GET', f'/booking-multi?rooms={room_ids[0]}:1,{room_ids[1]}:2', {}, 1),
+        ('check_availability', 'POST', '/api/check-availability',
+            {'json': {'room_id': room_ids[0], 'quantity': 1, **stay}}, 1),
+        ('batch_availability', 'POST', '/api/availability', {'json': {'per_night': True, **stay}}, 2),
+        ('search_rooms', 'POST', '/api/search', {'json': {'guests': 5, 'amenities': ['WiFi'], **stay}}, 3),
+        ('api_rooms', 'GET', '/api/rooms', {}, 1),
+        ('create_room_hold', 'POST', '/api/holds',
+            {'json': {'rooms': [{'room_id': room_ids[1], 'quantity': 1}], **stay}}, 4),
+        ('release_room_hold', 'DELETE', '/api/holds/unknown-token', {}, 1),
+        ('book_room', 'POST', '/book', {'data': booking_form}, 10),
+        ('booking_success', 'GET', f'/booking-success/{first}', {}, 2),
+        ('admin_login', 'GET', '/admin/login', {}, 0),
+        ('admin_login', 'POST', '/admin/login', {'data': {'username': 'nobody', 'password': 'x'}}, 1),
+        # First admin page also looks up the signed-in admin, cached afterwards
+        ('admin_dashboard', 'GET', '/admin/dashboard', {}, 5),
+        ('admin_rooms', 'GET', '/admin/rooms', {}, 1),
+        ('admin_bookings', 'GET', '/admin/bookings', {}, 2),
+        ('admin_bookings', 'GET', '/admin/bookings?status=confirmed&email=guest1&date_from=2000-01-01', {}, 2),
+        ('admin_bookings_json', 'GET', '/admin/bookings.json?status=all', {}, 2),
+        ('admin_cache_stats', 'GET', '/admin/cache-stats', {}, 1),
+        # Room writes bump the catalog generation: UPDATE and SELECT (plus the counter's first INSERT)
+        ('add_room', 'POST', '/admin/room/add', {'data': room_form}, 6),
+        ('edit_room', 'POST', f'/admin/room/edit/{spare_room_id}', {'data': room_form}, 8),
+        ('update_booking_status', 'POST', f'/admin/booking/update/{first}', {'data': {'status': 'cancelled'}}, 11),
+        ('delete_booking', 'POST', f'/admin/booking/delete/{second}', {}, 12),
+        ('delete_room', 'POST', f'/admin/room/delete/{spare_room_id}', {}, 11),
+        ('media_file', 'GET', '/media/0123456789abcdef/320.webp', {}, 0),
+        ('asset_file', 'GET', '/assets/main.0123456789ab.css', {}, 0),
+        # Last, so the admin session survives the checks above
+        ('admin_logout', 'GET', '/admin/logout', {}, 0),
+    ]
+
+
+def seed_bookings(hotel, room_ids, count):
+    """Create bookings spread over the next weeks, plus one legacy booking"""
+    with hotel.app.app_context():
+        rooms = hotel.Room.query.filter(hotel.Room.id.in_(room_ids)).all()
+        booking_ids = []
+        for i in range(count):
+            check_in = date.today() + timedelta(days=i % 20)
+            booking = hotel.create_booking(
+                {
+                    'guest_name': f'Guest {i}', 'guest_email': f'guest{i}@example.com',
+                    'guest_phone': '5550000000', 'special_requests': None
+                },
+                check_in, check_in + timedelta(days=2),
+                [{'room': room, 'quantity': 1, 'guests': 1} for room in rooms[:2]]
+            )
+            booking_ids.append(booking.id)
+
+        legacy = hotel.Booking(
+            guest_name='Legacy Guest', guest_email='legacy@example.com', guest_phone='5550000000',
+            check_in=date.today(), check_out=date.today() + timedelta(days=1),
+            total_price=100, status='confirmed', room_id=rooms[0].id, guests=1
+        )
+        hotel.db.session.add(legacy)
+        hotel.db.session.commit()
+        return booking_ids
+
+
+def full_table_scans(connection, statement, parameters):
+    """EXPLAIN QUERY PLAN lines that scan a booking table without an index"""
+    plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    scans = []
+    for row in plan:
+        detail = row[-1]
+        words = detail.split()
+        if words[:1] == ['SCAN'] and len(words) > 1 and words[1] in BOOKING_TABLES and 'USING' not in words:
+            scans.append(detail)
+    return scans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Per-route SQL statement budgets')
+    parser.add_argument('--bookings', type=int, default=40)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='hotel-queries-')
+    # The generation is re-read once a second per worker, not per request; keep
+    # that out of the counts so they do not depend on how long the checks take
+    os.environ['CATALOG_GENERATION_TTL_S'] = '3600'
+    hotel = load_app('sqlite:///' + os.path.join(workdir, 'queries.db'))
+    room_ids = seed_rooms(hotel, 3, units=args.bookings + 5)
+    spare_room_id = seed_rooms(hotel, 1, units=1)[0]
+    booking_ids = seed_bookings(hotel, room_ids, args.bookings)
+
+    statements = []
+    with hotel.app.app_context():
+        engine = hotel.db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, None if executemany else parameters))
+
+    with hotel.app.app_context():
+        admin = hotel.Admin(username='admin', email='admin@example.com',
+                            password_hash=generate_password_hash('admin', method='pbkdf2:sha256:1'))
+        hotel.db.session.add(admin)
+        hotel.db.session.commit()
+        admin_id, admin_auth = admin.id, hotel.auth_stamp(admin.password_hash)
+
+    client = hotel.app.test_client()
+    with client.session_transaction() as sess:
+        sess['admin_id'] = admin_id
+        sess['admin_username'] = 'admin'
+        sess['admin_auth'] = admin_auth
+
+    checks = route_checks(room_ids, booking_ids, spare_room_id)
+    failures = []
+    hot_statements = []
+    for endpoint, method, path, kwargs, budget in checks:
+        statements.clear()
+        response = client.open(path, method=method, **kwargs)
+        used = len(statements)
+        status = 'ok' if used <= budget else 'OVER'
+        print(f"{status:4}  {method:4} {path:55} {used:3} / {budget} statements  (HTTP {response.status_code})")
+        if used > budget or response.status_code >= 500:
+            failures.append(endpoint)
+            for statement, _ in statements:
+                print('        ' + ' '.join(statement.split())[:150])
+        if endpoint in HOT_ENDPOINTS:
+            hot_statements.extend((path, statement, parameters) for statement, parameters in statements)
+
+    scans = []
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            for path, statement, parameters in hot_statements:
+                if parameters is None or not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                for detail in full_table_scans(connection, statement, parameters):
+                    scans.append(path)
+                    print(f"SCAN  {path}: {detail}")
+                    print('        ' + ' '.join(statement.split())[:150])
+    print(f"\nChecked query plans of {len(hot_statements)} hot statements")
+
+    covered = {check[0] for check in checks}
+    missing = sorted(
+        rule.endpoint for rule in hotel.app.url_map.iter_rules()
+        if rule.endpoint.rpartition('.')[2] not in covered and rule.endpoint not in EXEMPT_ENDPOINTS
+    )
+    for endpoint in missing:
+        print(f"MISSING budget for endpoint '{endpoint}'")
+
+    if failures or missing or scans:
+        print(f"\n❌ {len(failures)} route(s) over budget, {len(missing)} without a budget, "
+              f"{len(scans)} full table scan(s)")
+        return 1
+    print(f"\n✅ All {len(checks)} route checks within budget, no full table scans")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
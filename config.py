@@ -3,4 +3,118 @@ import os
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///hotel.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Several hotel properties from one deployment, one database each (see
+    # properties.py): PROPERTIES="downtown=sqlite:///downtown.db beach=postgresql://..."
+    # and optionally PROPERTY_HOSTS="downtown.example.com=downtown ..."
+    PROPERTIES = dict(entry.split('=', 1) for entry in os.environ.get('PROPERTIES', '').split())
+    PROPERTY_HOSTS = {
+        host.lower(): key for host, key in (entry.split('=', 1) for entry in os.environ.get('PROPERTY_HOSTS', '').split())
+    }
+    DEFAULT_PROPERTY = os.environ.get('DEFAULT_PROPERTY') or next(iter(PROPERTIES), None)
+    SQLALCHEMY_BINDS = dict(PROPERTIES)
+
+    # Connection pool per worker process; pre-ping replaces connections the
+    # database closed (restarts, idle timeouts) before a request sees them
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
+
+    # Applied to every new connection when the database is SQLite
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+    # Per-lookup timeout for the async JSON APIs served by asgi.py, and the
+    # threads each asgi.py worker gives to the Flask routes (pages, POST /book);
+    # keep it within DB_POOL_SIZE + DB_MAX_OVERFLOW
+    ASYNC_API_TIMEOUT_MS = int(os.environ.get('ASYNC_API_TIMEOUT_MS', 2000))
+    ASGI_FLASK_THREADS = int(os.environ.get('ASGI_FLASK_THREADS', 8))
+
+    # Catalog pages (home, room list, room detail, /api/rooms) carry strong ETags.
+    # Browsers revalidate every time (a cheap 304); a CDN may serve its copy
+    # for s-maxage seconds after an admin edit
+    CATALOG_CACHE_CONTROL = os.environ.get(
+        'CATALOG_CACHE_CONTROL', 'public, max-age=0, s-maxage=60, stale-while-revalidate=30'
+    )
+
+    # Rendered template fragments kept per worker (characters, 0 disables)
+    FRAGMENT_CACHE_MAX_SIZE = int(os.environ.get('FRAGMENT_CACHE_MAX_SIZE', 8 * 1024 * 1024))
+    # Compiled Jinja templates shared on disk by every worker (empty disables)
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get(
+        'JINJA_BYTECODE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'jinja-cache')
+    )
+
+    # Rooms selected on /booking-select are held this long while the guest
+    # fills in the booking form; each worker's sweeper releases expired holds
+    # every HOLD_SWEEP_INTERVAL_S seconds, HOLD_SWEEP_BATCH per transaction
+    # (0 disables the thread, run `flask expire-holds` from cron instead)
+    HOLD_MINUTES = int(os.environ.get('HOLD_MINUTES', 15))
+    HOLD_SWEEP_INTERVAL_S = float(os.environ.get('HOLD_SWEEP_INTERVAL_S', 30))
+    HOLD_SWEEP_BATCH = int(os.environ.get('HOLD_SWEEP_BATCH', 500))
+    # Holds need no login, so each is capped: units per room type (default as
+    # many as a search combination can use), nights, live holds per browser
+    # session, and holds created per client IP (token bucket, see throttle.py:
+    # burst, then so many per minute)
+    HOLD_MAX_UNITS = int(os.environ.get('HOLD_MAX_UNITS', 6))
+    HOLD_MAX_NIGHTS = int(os.environ.get('HOLD_MAX_NIGHTS', 30))
+    HOLD_MAX_PER_SESSION = int(os.environ.get('HOLD_MAX_PER_SESSION', 3))
+    HOLD_IP_BURST = int(os.environ.get('HOLD_IP_BURST', 10))
+    HOLD_IP_PER_MINUTE = float(os.environ.get('HOLD_IP_PER_MINUTE', 5))
+
+    # archive.py: age after which stays leave the live booking tables, bookings
+    # per transaction, and an optional separate database for the archive
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+    ARCHIVE_DATABASE_URL = os.environ.get('ARCHIVE_DATABASE_URL')
+
+    # migrations.py: rows per backfill transaction
+    MIGRATION_BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', 1000))
+
+    # Room images copied locally and resized by media.py: storage directory,
+    # variant widths, background threads per worker (0: only `flask ingest-media`),
+    # download limits and encoder qualities
+    MEDIA_ROOT = os.environ.get(
+        'MEDIA_ROOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'media')
+    )
+    MEDIA_WIDTHS = [int(width) for width in os.environ.get('MEDIA_WIDTHS', '320,640,960,1600').split(',')]
+    MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', 2))
+    MEDIA_MAX_BYTES = int(os.environ.get('MEDIA_MAX_BYTES', 20 * 1024 * 1024))
+    MEDIA_FETCH_TIMEOUT_S = float(os.environ.get('MEDIA_FETCH_TIMEOUT_S', 15))
+    MEDIA_JPEG_QUALITY = int(os.environ.get('MEDIA_JPEG_QUALITY', 82))
+    MEDIA_WEBP_QUALITY = int(os.environ.get('MEDIA_WEBP_QUALITY', 80))
+
+    # Minified, content-hashed CSS/JS bundles and their gzip/brotli copies,
+    # written by `flask build-assets` (see assets.py) and served at /assets/
+    ASSETS_ROOT = os.environ.get(
+        'ASSETS_ROOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'assets')
+    )
+
+    # Optional Redis URL so every worker sees room catalog invalidations at
+    # once (and shares the admin login rate limits). Without it the catalog
+    # generation is kept in the database, read at most once per this many
+    # seconds per worker
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    CATALOG_GENERATION_TTL_S = float(os.environ.get('CATALOG_GENERATION_TTL_S', 1))
+
+    # Admin login throttling (see throttle.py): token buckets per client IP and
+    # per username (burst attempts, refilled at so many per minute), and the
+    # threads and queue slots each worker gives to password hash checks
+    LOGIN_IP_BURST = int(os.environ.get('LOGIN_IP_BURST', 10))
+    LOGIN_IP_PER_MINUTE = float(os.environ.get('LOGIN_IP_PER_MINUTE', 10))
+    LOGIN_USER_BURST = int(os.environ.get('LOGIN_USER_BURST', 5))
+    LOGIN_USER_PER_MINUTE = float(os.environ.get('LOGIN_USER_PER_MINUTE', 2))
+    LOGIN_HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS', 1))
+    LOGIN_HASH_QUEUE = int(os.environ.get('LOGIN_HASH_QUEUE', 4))
+    # Signed-in admins are looked up once per worker in this many seconds
+    ADMIN_PRINCIPAL_TTL_S = float(os.environ.get('ADMIN_PRINCIPAL_TTL_S', 60))
+
+    # Opt-in request profiling: Server-Timing header and /metrics (see profiling.py)
+    PROFILING = os.environ.get('PROFILING') == '1'
+    # Setting a dump directory also turns on the sampling profiler for the slowest requests
+    PROFILING_DUMP_DIR = os.environ.get('PROFILING_DUMP_DIR')
+    PROFILING_SLOWEST = int(os.environ.get('PROFILING_SLOWEST', 10))
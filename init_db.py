@@ -1,60 +1,30 @@
-from app import app, db, Room, Admin
+from models import create_db_app, db, Room, Admin, sync_room_amenities
+from migrations import migrate
+from properties import property_keys, property_label, use_property
 from werkzeug.security import generate_password_hash
 import json
-import os
 
-def recreate_database():
-    """Completely recreate database with correct schema"""
+def init_database():
+    """Bring the database up to date in place and seed an empty one.
     
+    Applies pending migrations (see migrations.py), then adds sample rooms
+    when there are no rooms and a default admin when there are no admins.
+    Existing rooms, bookings and admins are never touched. With PROPERTIES
+    set this is done for every property database.
+    """
+    app = create_db_app()
     with app.app_context():
-        print("🔄 Recreating database with proper multi-room support...")
-        
-        # Backup existing room data
-        rooms_backup = []
-        admins_backup = []
-        
-        try:
-            for room in Room.query.all():
-                rooms_backup.append({
-                    'name': room.name,
-                    'type': room.type,
-                    'price': room.price,
-                    'capacity': room.capacity,
-                    'description': room.description,
-                    'amenities': room.amenities,
-                    'images': room.images,
-                    'videos': room.videos,
-                    'available': room.available,
-                    'total_rooms': getattr(room, 'total_rooms', 5)
-                })
-            print(f"📦 Backed up {len(rooms_backup)} rooms")
-            
-            for admin in Admin.query.all():
-                admins_backup.append({
-                    'username': admin.username,
-                    'password_hash': admin.password_hash,
-                    'email': admin.email
-                })
-            print(f"📦 Backed up {len(admins_backup)} admin accounts")
-        except:
-            print("⚠️  Creating fresh database...")
-        
-        # Remove old database
-        if os.path.exists('hotel.db'):
-            os.remove('hotel.db')
-            print("🗑️  Old database removed")
-        
-        # Create all tables with new schema
-        db.create_all()
-        print("✨ Created new database with updated schema")
+        for key in property_keys(app):
+            init_property(key)
+
+def init_property(key):
+    """Migrate and seed one property database (key None: the single database)"""
+    with use_property(db, key):
+        print(f"🔄 Applying database migrations{property_label(key)}...")
+        applied = migrate(db.engines[key], progress=lambda message: print(f"  … {message}"))
+        print(f"✨ Schema up to date ({len(applied)} migrations applied)")
         
-        # Restore or create data
-        if rooms_backup:
-            for room_data in rooms_backup:
-                room = Room(**room_data)
-                db.session.add(room)
-            print(f"✅ Restored {len(rooms_backup)} rooms")
-        else:
+        if Room.query.first() is None:
             # Create sample rooms
             sample_rooms = [
                 {
@@ -106,19 +76,16 @@ def recreate_database():
                     'total_rooms': 15
                 }
             ]
-            
+
             for room_data in sample_rooms:
                 room = Room(**room_data)
+                sync_room_amenities(room)
                 db.session.add(room)
             print(f"✅ Created {len(sample_rooms)} sample rooms")
-        
-        if admins_backup:
-            for admin_data in admins_backup:
-                admin = Admin(**admin_data)
-                db.session.add(admin)
-            print(f"✅ Restored {len(admins_backup)} admin accounts")
         else:
-            # Create default admin
+            print("📦 Rooms already exist, sample rooms skipped")
+        
+        if Admin.query.first() is None:
             admin = Admin(
                 username='admin',
                 password_hash=generate_password_hash('admin123'),
@@ -126,6 +93,8 @@ def recreate_database():
             )
             db.session.add(admin)
             print("✅ Created default admin (username: admin, password: admin123)")
+        else:
+            print("📦 Admin accounts already exist, default admin skipped")
         
         db.session.commit()
         
@@ -143,8 +112,4 @@ def recreate_database():
         print("="*60)
 
 if __name__ == '__main__':
-    response = input("⚠️  This will recreate the database. All bookings will be lost. Continue? (yes/no): ")
-    if response.lower() in ['yes', 'y']:
-        recreate_database()
-    else:
-        print("❌ Operation cancelled")
\ No newline at end of file
+    init_database()
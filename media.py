@@ -0,0 +1,215 @@
+"""Room image pipeline: local copies, resized JPEG and WebP variants.
+
+Room.images holds image URLs, usually full-size remote originals. Each URL
+is ingested once: downloaded, stored under MEDIA_ROOT/<digest>/ (digest is
+the content hash of the original) and rendered at every MEDIA_WIDTHS width
+up to the original's own, as progressive JPEG and as WebP. A media_asset row
+per URL records the digest and the widths made.
+
+Ingestion runs on a small background thread pool in each worker, started
+when an admin saves a room; `flask ingest-media` does every room image at
+once. When an image is ready the room catalog generation is bumped, so
+cached pages pick up the local variants. Until then, or if ingestion fails,
+pages keep the original URL.
+
+Variant files never change once written (a different image gets a
+different digest), so they are served with a one-year immutable
+Cache-Control. Needs Pillow (requirements.txt) to ingest; serving and
+rendering pages do not import it.
+"""
+import hashlib
+import io
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from flask import current_app, url_for
+from sqlalchemy.exc import IntegrityError
+
+from models import db, MediaAsset
+from properties import use_property
+
+# Cache-Control of variant files, their URLs change whenever their contents would
+MEDIA_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Variant formats: file extension, Pillow format name
+FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+
+
+def fetch_image(url):
+    """Bytes of an http(s) image URL, or of a file under the static folder for /static/ paths"""
+    config = current_app.config
+    if url.startswith(current_app.static_url_path + '/'):
+        path = os.path.join(current_app.static_folder, url[len(current_app.static_url_path) + 1:])
+        if os.path.commonpath([os.path.abspath(path), current_app.static_folder]) != current_app.static_folder:
+            raise ValueError(f'{url} is outside the static folder')
+        with open(path, 'rb') as f:
+            return f.read(config['MEDIA_MAX_BYTES'] + 1)
+    if urlsplit(url).scheme not in ('http', 'https'):
+        raise ValueError(f'{url} is not an http(s) or static URL')
+    request = urllib.request.Request(url, headers={'User-Agent': 'hotel-media/1.0'})
+    with urllib.request.urlopen(request, timeout=config['MEDIA_FETCH_TIMEOUT_S']) as response:
+        data = response.read(config['MEDIA_MAX_BYTES'] + 1)
+    if len(data) > config['MEDIA_MAX_BYTES']:
+        raise ValueError(f'{url} is larger than MEDIA_MAX_BYTES')
+    return data
+
+
+def render_variants(data, directory):
+    """Write every variant of an image into directory, returns (width, height, widths)"""
+    from PIL import Image, ImageOps  # optional dependency, only needed to ingest images
+    config = current_app.config
+    options = {
+        'WEBP': {'quality': config['MEDIA_WEBP_QUALITY'], 'method': 4},
+        'JPEG': {'quality': config['MEDIA_JPEG_QUALITY'], 'optimize': True, 'progressive': True}
+    }
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    widths = sorted({min(width, image.width) for width in config['MEDIA_WIDTHS']})
+    os.makedirs(directory, exist_ok=True)
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        variant = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for extension, image_format in FORMATS:
+            path = os.path.join(directory, f'{width}.{extension}')
+            if os.path.exists(path):
+                continue  # Same image ingested from another URL
+            # Written aside and renamed, so a file is never served half-written
+            partial = f'{path}.{threading.get_ident()}.part'
+            variant.save(partial, image_format, **options[image_format])
+            os.replace(partial, path)
+    return image.width, image.height, widths
+
+
+def asset_for(url):
+    """The media_asset row of a URL, created as pending if missing"""
+    asset = MediaAsset.query.filter_by(source_url=url).first()
+    if asset is None:
+        try:
+            asset = MediaAsset(source_url=url, status='pending')
+            db.session.add(asset)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Another worker added it first
+            asset = MediaAsset.query.filter_by(source_url=url).one()
+    return asset
+
+
+def ingest(url, retry_failed=False):
+    """Copy one image URL into local storage with its variants, returns its media_asset row"""
+    asset = asset_for(url)
+    if asset.status == 'ready' or (asset.status == 'failed' and not retry_failed):
+        return asset
+    asset_id = asset.id
+    db.session.close()  # No pooled connection held while downloading and resizing
+
+    try:
+        data = fetch_image(url)
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        width, height, widths = render_variants(data, os.path.join(current_app.config['MEDIA_ROOT'], digest))
+        values = {'status': 'ready', 'digest': digest, 'width': width, 'height': height, 'widths': widths, 'error': None}
+    except Exception as e:
+        current_app.logger.warning('Media ingest of %s failed: %s', url, e)
+        values = {'status': 'failed', 'error': str(e)[:500]}
+
+    asset = db.session.get(MediaAsset, asset_id)
+    for name, value in values.items():
+        setattr(asset, name, value)
+    db.session.commit()
+    return asset
+
+
+def load_media(urls):
+    """{url: (digest, widths, width, height)} of the ready assets among urls"""
+    urls = list(set(urls))
+    media = {}
+    for start in range(0, len(urls), 500):
+        media.update(
+            (asset.source_url, (asset.digest, tuple(asset.widths), asset.width, asset.height))
+            for asset in MediaAsset.query.filter(
+                MediaAsset.source_url.in_(urls[start:start + 500]), MediaAsset.status == 'ready'
+            )
+        )
+    return media
+
+
+def image_set(url, media):
+    """src, srcset, WebP srcset and size of an image for the templates.
+
+    media is the (digest, widths, width, height) of its asset or None, in
+    which case the original URL is used as is.
+    """
+    if media is None:
+        return SimpleNamespace(src=url, srcset='', webp_srcset='', width=None, height=None)
+    digest, widths, width, height = media
+
+    def srcset(extension):
+        return ', '.join(
+            f"{url_for('hotel.media_file', digest=digest, filename=f'{size}.{extension}')} {size}w"
+            for size in widths
+        )
+
+    # Fallback src: the variant closest to a typical card, 640 px
+    src_width = min(widths, key=lambda size: abs(size - 640))
+    return SimpleNamespace(
+        src=url_for('hotel.media_file', digest=digest, filename=f'{src_width}.jpg'),
+        srcset=srcset('jpg'),
+        webp_srcset=srcset('webp'),
+        width=width,
+        height=height
+    )
+
+
+class MediaPipeline:
+    """Background threads ingesting image URLs for one app, each URL queued once at a time"""
+
+    def __init__(self, app, workers, on_ready=None):
+        self.app = app
+        self.workers = workers
+        self.on_ready = on_ready
+        self.ingested = 0
+        self.failed = 0
+        self._queued = set()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, urls, property_key=None, retry_failed=False):
+        """Queue URLs for ingestion (no-op when MEDIA_WORKERS is 0), returns the futures queued"""
+        if not self.workers:
+            return []
+        futures = []
+        with self._lock:
+            if self._executor is None:
+                # Started on first use, so forked workers each start their own threads
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='media')
+            for url in urls:
+                key = (property_key, url)
+                if not url or key in self._queued:
+                    continue
+                self._queued.add(key)
+                future = self._executor.submit(self._run, property_key, url, retry_failed)
+                future.add_done_callback(lambda _, key=key: self._queued.discard(key))
+                futures.append(future)
+        return futures
+
+    def _run(self, property_key, url, retry_failed):
+        with self.app.app_context(), use_property(db, property_key):
+            try:
+                asset = ingest(url, retry_failed)
+            except Exception:
+                self.app.logger.exception('Media ingest of %s failed', url)
+                self.failed += 1
+                return None
+            if asset.status == 'ready':
+                self.ingested += 1
+                if self.on_ready:
+                    self.on_ready()
+            else:
+                self.failed += 1
+            return asset.status
+
+    def stats(self):
+        return {'workers': self.workers, 'queued': len(self._queued), 'ingested': self.ingested, 'failed': self.failed}
@@ -0,0 +1,383 @@
+"""Versioned schema migrations, applied in place to a live database.
+
+Usage:
+    python migrations.py up [--to VERSION] [--batch 1000] [--pause-ms 20] [--property KEY]
+    python migrations.py status [--property KEY]
+
+Each migration has a version number and runs once per database; the
+schema_migration table records which versions are applied. Migrations are
+written to be safe against a database that is serving bookings:
+
+- new columns are added nullable or with a constant default, which only
+  changes the table definition, and are then backfilled in primary-key
+  batches of one short transaction each, with a pause in between
+- every batch commits together with the migration's checkpoint, so a run
+  that is interrupted (or stopped) resumes after the last committed batch
+- indexes are built with CREATE INDEX CONCURRENTLY on Postgres, which does
+  not block writes; SQLite holds its write lock while one index builds,
+  readers are not blocked (WAL) and writers wait up to the busy timeout
+- every step checks the schema first, so a database created from the
+  models (create_tables) or migrated by hand is simply brought up to date
+
+To change the schema, add a function decorated with @migration(next
+version, name) at the end of this file and call the Migrator helpers from
+it. With PROPERTIES set, every property database is migrated in turn
+(or only the one given with --property), never the DATABASE_URL one.
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, Text, bindparam, delete, inspect, select, text
+)
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateIndex
+
+from config import Config
+from ledger import rebuild_booking_stats, rebuild_room_nights
+from models import (
+    create_db_app, db, Admin, Booking, BookingItem, BookingStats, CacheCounter, DailyBookingStats, MediaAsset, Room,
+    RoomAmenity, RoomHold, RoomNight
+)
+from properties import property_label, selected_properties, use_property
+
+# Attempts for a batch that loses a write race with the booking routes
+BATCH_MAX_ATTEMPTS = 3
+
+migration_metadata = MetaData()
+
+schema_migration = Table(
+    'schema_migration', migration_metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('name', String(200), nullable=False),
+    Column('state', String(20), nullable=False),  # running, done
+    Column('checkpoint', Text),  # JSON: step name -> last primary key done, or true
+    Column('started_at', DateTime),
+    Column('finished_at', DateTime)
+)
+
+Migration = namedtuple('Migration', 'version name apply')
+
+# Every migration, in version order (see migration())
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register a function as the migration with this version"""
+    def register(apply):
+        assert not MIGRATIONS or version > MIGRATIONS[-1].version, 'migration versions must increase'
+        MIGRATIONS.append(Migration(version, name, apply))
+        return apply
+    return register
+
+
+class Migrator:
+    """Schema and backfill helpers for one migration, saving its progress as it goes"""
+
+    def __init__(self, engine, version, checkpoint, batch_size, pause, progress=None):
+        self.engine = engine
+        self.version = version
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.pause = pause
+        self.progress = progress or (lambda message: None)
+
+    def columns(self, table_name):
+        return {column['name'] for column in inspect(self.engine).get_columns(table_name)}
+
+    def create_tables(self, *tables):
+        """Create the given model tables, with their indexes, unless they exist"""
+        db.metadata.create_all(self.engine, tables=list(tables))
+
+    def add_column(self, table_name, name, definition):
+        """ALTER TABLE ... ADD COLUMN unless the column exists; definition is e.g. 'INTEGER DEFAULT 5'"""
+        if name in self.columns(table_name):
+            return False
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(f'ALTER TABLE {table_name} ADD COLUMN {name} {definition}')
+        self.progress(f"column {table_name}.{name} added")
+        return True
+
+    def create_index(self, index):
+        """Build a model index unless it exists, without blocking writes where the database can"""
+        ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=self.engine.dialect))
+        if self.engine.dialect.name == 'postgresql':
+            # Must run outside a transaction. A failed concurrent build leaves an
+            # invalid index behind, dropped here so the next run builds it again
+            with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                valid = connection.execute(text(
+                    'SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+                    'WHERE c.relname = :name'
+                ), {'name': index.name}).scalar()
+                if valid:
+                    return False
+                if valid is not None:
+                    connection.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS {index.name}')
+                connection.exec_driver_sql(re.sub(r'^CREATE (UNIQUE )?INDEX', r'CREATE \1INDEX CONCURRENTLY', ddl))
+        else:
+            existing = {row['name'] for row in inspect(self.engine).get_indexes(index.table.name)}
+            if index.name in existing:
+                return False
+            with self.engine.begin() as connection:
+                connection.exec_driver_sql(ddl)
+        self.progress(f"index {index.name} built")
+        return True
+
+    def backfill(self, step, table, update, columns=()):
+        """Call update(connection, rows) for every row of table, batch by batch in id order.
+
+        rows are mappings of id plus the given columns. Each batch runs in
+        its own transaction, which also records the last id done, so an
+        interrupted backfill resumes with the next batch. Returns rows visited.
+        """
+        after = self.checkpoint.get(step, 0)
+        if after is True:
+            return 0
+        done = 0
+        while True:
+            for attempt in range(BATCH_MAX_ATTEMPTS):
+                try:
+                    with self.engine.begin() as connection:
+                        rows = connection.execute(
+                            select(table.c.id, *columns).where(table.c.id > after)
+                            .order_by(table.c.id).limit(self.batch_size)
+                        ).mappings().all()
+                        if rows:
+                            update(connection, rows)
+                        self._save(connection, step, rows[-1]['id'] if rows else True)
+                    break
+                except OperationalError:
+                    # Lost a write race with a booking (lock timeout); the batch is retried whole
+                    if attempt == BATCH_MAX_ATTEMPTS - 1:
+                        raise
+                    time.sleep(self.pause + 0.1 * (attempt + 1))
+            if not rows:
+                return done
+            after = rows[-1]['id']
+            done += len(rows)
+            self.progress(f"{step}: {done} rows")
+            time.sleep(self.pause)  # Lets queued booking writes in between batches
+
+    def once(self, step, run):
+        """Call run() unless this step already completed in an earlier run"""
+        if self.checkpoint.get(step) is True:
+            return None
+        result = run()
+        with self.engine.begin() as connection:
+            self._save(connection, step, True)
+        return result
+
+    def _save(self, connection, step, value):
+        self.checkpoint[step] = value
+        connection.execute(
+            schema_migration.update().where(schema_migration.c.version == self.version)
+            .values(checkpoint=json.dumps(self.checkpoint))
+        )
+
+
+def migration_states(engine):
+    """{version: schema_migration row} of the migrations started on this database"""
+    migration_metadata.create_all(engine)
+    with engine.connect() as connection:
+        return {row.version: row for row in connection.execute(select(schema_migration))}
+
+
+def migrate(engine, target=None, batch_size=Config.MIGRATION_BATCH_SIZE, pause=0.02, progress=None):
+    """Apply pending migrations up to target (default all) in order, returns those applied"""
+    states = migration_states(engine)
+    applied = []
+    for entry in MIGRATIONS:
+        if target is not None and entry.version > target:
+            break
+        state = states.get(entry.version)
+        if state is not None and state.state == 'done':
+            continue
+        if state is None:
+            with engine.begin() as connection:
+                connection.execute(schema_migration.insert().values(
+                    version=entry.version, name=entry.name, state='running',
+                    checkpoint='{}', started_at=datetime.utcnow()
+                ))
+        checkpoint = json.loads(state.checkpoint or '{}') if state is not None else {}
+        if progress:
+            progress(f"{entry.version:04d} {entry.name}" + (' (resuming)' if checkpoint else ''))
+        entry.apply(Migrator(engine, entry.version, checkpoint, batch_size, pause, progress))
+        with engine.begin() as connection:
+            connection.execute(
+                schema_migration.update().where(schema_migration.c.version == entry.version)
+                .values(state='done', finished_at=datetime.utcnow())
+            )
+        applied.append(entry)
+    return applied
+
+
+# Migrations. Released versions never change; add new ones at the end. A
+# migration names the tables and indexes it creates, so what a version does
+# never depends on the models of the release running it.
+
+@migration(1, 'baseline tables')
+def baseline_tables(m):
+    m.create_tables(Room.__table__, Admin.__table__, Booking.__table__, BookingItem.__table__)
+
+
+@migration(2, 'room inventory column')
+def room_inventory(m):
+    room = Room.__table__
+    m.add_column('room', 'total_rooms', 'INTEGER DEFAULT 5')
+    m.backfill('total_rooms', room, lambda connection, rows: connection.execute(
+        room.update()
+        .where(room.c.id.in_([row['id'] for row in rows]), room.c.total_rooms.is_(None))
+        .values(total_rooms=5)
+    ))
+
+
+@migration(3, 'room night ledger table')
+def room_night_table(m):
+    m.create_tables(RoomNight.__table__)
+
+
+@migration(4, 'room amenity table')
+def room_amenity_table(m):
+    m.create_tables(RoomAmenity.__table__)
+
+
+def normalize_room_json(connection, rows):
+    """Rewrite amenities/images/videos as JSON lists and mirror amenities into room_amenity"""
+    # JSONList already decodes malformed or non-list values as []; writing
+    # them back through it stores canonical JSON
+    room, amenity = Room.__table__, RoomAmenity.__table__
+    connection.execute(
+        room.update().where(room.c.id == bindparam('b_id')).values(
+            amenities=bindparam('b_amenities'), images=bindparam('b_images'), videos=bindparam('b_videos')
+        ),
+        [
+            {
+                'b_id': row['id'], 'b_amenities': row['amenities'] or [],
+                'b_images': row['images'] or [], 'b_videos': row['videos'] or []
+            }
+            for row in rows
+        ]
+    )
+    ids = [row['id'] for row in rows]
+    connection.execute(delete(amenity).where(amenity.c.room_id.in_(ids)))
+    amenity_rows = [
+        {'room_id': row['id'], 'amenity': name}
+        for row in rows for name in sorted({str(value)[:100] for value in row['amenities'] or []})
+    ]
+    if amenity_rows:
+        connection.execute(amenity.insert(), amenity_rows)
+
+
+@migration(5, 'structured room json columns')
+def room_json(m):
+    room = Room.__table__
+    m.backfill('room_json', room, normalize_room_json, columns=(room.c.amenities, room.c.images, room.c.videos))
+
+
+@migration(6, 'dashboard stats tables')
+def booking_stats_tables(m):
+    m.create_tables(BookingStats.__table__, DailyBookingStats.__table__)
+
+
+@migration(7, 'room hold table')
+def room_hold_table(m):
+    m.create_tables(RoomHold.__table__)
+
+
+# Indexes added to the baseline tables; tables created since come with theirs
+BASELINE_INDEXES = (
+    'ix_booking_created_at_id', 'ix_booking_status_created_at_id', 'ix_booking_guest_email',
+    'ix_booking_status_dates', 'ix_booking_room_status_dates', 'ix_booking_status_total_price',
+    'ix_booking_item_booking_id', 'ix_booking_item_room_booking'
+)
+
+
+@migration(8, 'booking indexes')
+def booking_indexes(m):
+    indexes = {index.name: index for table in (Booking.__table__, BookingItem.__table__) for index in table.indexes}
+    for name in sorted(BASELINE_INDEXES):
+        m.create_index(indexes[name])
+
+
+@migration(9, 'room night ledger and dashboard stats')
+def ledger_backfill(m):
+    m.once('room_night', rebuild_room_nights)
+    m.once('booking_stats', rebuild_booking_stats)
+
+
+@migration(10, 'media assets')
+def media_assets(m):
+    m.create_tables(MediaAsset.__table__)
+
+
+@migration(11, 'shared cache counters')
+def cache_counters(m):
+    m.create_tables(CacheCounter.__table__)
+
+
+def run_up(args):
+    app = create_db_app()
+    with app.app_context():
+        for key in selected_properties(app, args.property):
+            started = time.perf_counter()
+            # Backfills go through db.session, so they run on the same property
+            with use_property(db, key):
+                applied = migrate(
+                    db.engines[key], args.to, args.batch, args.pause_ms / 1000,
+                    progress=lambda message: print(f"  … {message}", file=sys.stderr)
+                )
+            if applied:
+                print(f"✅ Applied {len(applied)} migrations in {time.perf_counter() - started:.1f}s"
+                      f"{property_label(key)}", file=sys.stderr)
+            else:
+                print(f"✅ Database is up to date{property_label(key)}", file=sys.stderr)
+    return 0
+
+
+def run_status(args):
+    app = create_db_app()
+    with app.app_context():
+        for key in selected_properties(app, args.property):
+            states = migration_states(db.engines[key])
+            if key:
+                print(f"[{key}]")
+            for entry in MIGRATIONS:
+                state = states.get(entry.version)
+                if state is None:
+                    status = 'pending'
+                elif state.state == 'done':
+                    status = f"applied {state.finished_at:%Y-%m-%d %H:%M}"
+                else:
+                    status = f"interrupted, progress {state.checkpoint}"
+                print(f"{entry.version:04d}  {entry.name:45} {status}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply versioned schema migrations in place')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    up = commands.add_parser('up', help='apply pending migrations, resuming an interrupted one')
+    up.add_argument('--to', type=int, help='stop after this version (default: latest)')
+    up.add_argument('--batch', type=int, default=Config.MIGRATION_BATCH_SIZE, help='rows per backfill transaction')
+    up.add_argument('--pause-ms', type=int, default=20, help='pause between backfill batches')
+    up.set_defaults(handler=run_up)
+
+    status = commands.add_parser('status', help='applied, interrupted and pending migrations')
+    status.set_defaults(handler=run_status)
+
+    for command in (up, status):
+        command.add_argument('--property', choices=sorted(Config.PROPERTIES),
+                             help='only this property (default: every property in PROPERTIES)')
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""Database models and the database-only app factory.
+
+Shared by the website (app.py) and the command-line scripts. Importing this
+module defines the tables only: no routes, templates, caches or background
+threads, so scripts and jobs built on create_db_app() start in a fraction
+of the time the full site takes.
+"""
+from flask import Flask, current_app, has_app_context
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from datetime import datetime
+import json
+import sqlite3
+
+from config import Config
+from properties import PropertySession
+
+# Bound to an app by create_db_app(); engines are made per app, not at import
+db = SQLAlchemy(session_options={'class_': PropertySession})
+
+def create_db_app(config=Config, import_name=__name__):
+    """Flask app with the configuration and database only (CLI scripts, jobs)"""
+    app = Flask(import_name)
+    app.config.from_object(config)
+    if app.config['SQLALCHEMY_DATABASE_URI'] in ('sqlite://', 'sqlite:///:memory:'):
+        # In-memory SQLite shares one connection instead of a pool
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    db.init_app(app)
+    return app
+
+@event.listens_for(Engine, 'connect')
+def tune_sqlite_connection(dbapi_connection, connection_record):
+    """WAL, busy timeout and sync level for every new SQLite connection"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    config = current_app.config if has_app_context() else vars(Config)
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    cursor.execute(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+    cursor.close()
+
+def create_tables():
+    """Create missing tables in the database of every property"""
+    db.create_all()
+    for key in current_app.config['PROPERTIES']:
+        db.metadata.create_all(db.engines[key])
+
+class JSONList(db.TypeDecorator):
+    """List stored as JSON text, decoded once when the row is loaded"""
+    impl = db.Text
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = json.loads(value)
+        return json.dumps(list(value))
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            decoded = json.loads(value)
+        except ValueError:
+            return []
+        return decoded if isinstance(decoded, list) else []
+
+# Models
+class Room(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    capacity = db.Column(db.Integer, nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    amenities = db.Column(JSONList, nullable=False)  # List of amenity names
+    images = db.Column(JSONList, nullable=False)  # List of image URLs
+    videos = db.Column(JSONList)  # List of video URLs
+    available = db.Column(db.Boolean, default=True)
+    total_rooms = db.Column(db.Integer, default=1)  # NEW: Total number of this room type
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    bookings = db.relationship('Booking', backref='room', lazy=True)
+    booking_items = db.relationship('BookingItem', backref='room', lazy=True)
+    amenity_rows = db.relationship('RoomAmenity', lazy=True, cascade='all, delete-orphan')
+
+# Normalized copy of Room.amenities so amenity filters can run (indexed) in SQL
+class RoomAmenity(db.Model):
+    __tablename__ = 'room_amenity'
+    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), primary_key=True)
+    amenity = db.Column(db.String(100), primary_key=True)
+    
+    __table_args__ = (db.Index('ix_room_amenity_amenity', 'amenity'),)
+
+class Booking(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    guest_name = db.Column(db.String(100), nullable=False)
+    guest_email = db.Column(db.String(120), nullable=False)
+    guest_phone = db.Column(db.String(20), nullable=False)
+    check_in = db.Column(db.Date, nullable=False)
+    check_out = db.Column(db.Date, nullable=False)
+    special_requests = db.Column(db.Text)
+    total_price = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, confirmed, cancelled
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # NEW: Relationship to booking items
+    items = db.relationship('BookingItem', backref='booking', lazy=True, cascade='all, delete-orphan')
+    
+    # Keep old room_id for backward compatibility with existing bookings
+    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=True)
+    guests = db.Column(db.Integer, nullable=True)
+    
+    __table_args__ = (
+        # Keyset pagination and filters of the admin booking list
+        db.Index('ix_booking_created_at_id', 'created_at', 'id'),
+        db.Index('ix_booking_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_booking_guest_email', 'guest_email'),
+        # Overlap checks by status and date (ledger rebuild, legacy per-room checks)
+        db.Index('ix_booking_status_dates', 'status', 'check_in', 'check_out'),
+        db.Index('ix_booking_room_status_dates', 'room_id', 'status', 'check_in', 'check_out'),
+        # Covering index for the dashboard revenue sum
+        db.Index('ix_booking_status_total_price', 'status', 'total_price'),
+    )
+
+# NEW: BookingItem model for multiple rooms per booking
+class BookingItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False)
+    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=False)
+    quantity = db.Column(db.Integer, default=1)  # Number of rooms of this type
+    guests = db.Column(db.Integer, nullable=False)  # Guests for this room
+    price_per_night = db.Column(db.Float, nullable=False)
+    subtotal = db.Column(db.Float, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_booking_item_booking_id', 'booking_id'),
+        db.Index('ix_booking_item_room_booking', 'room_id', 'booking_id'),
+    )
+
+# Per-night occupancy ledger: units booked for each room type on each night.
+# Maintained incrementally by the booking routes so availability is a bounded
+# range read instead of a scan over every overlapping booking.
+class RoomNight(db.Model):
+    __tablename__ = 'room_night'
+    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), primary_key=True)
+    night = db.Column(db.Date, primary_key=True)
+    booked = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Whole-hotel occupancy per night (dashboard trends)
+    __table_args__ = (db.Index('ix_room_night_night', 'night'),)
+
+# Short-lived claim on inventory while a guest fills in the booking form.
+# Held units are counted in room_night like booked ones; the rows of one
+# selection share a token, and expired rows are swept in expires_at order.
+class RoomHold(db.Model):
+    __tablename__ = 'room_hold'
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(64), nullable=False)
+    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    check_in = db.Column(db.Date, nullable=False)
+    check_out = db.Column(db.Date, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_room_hold_expires_at', 'expires_at'),
+        db.Index('ix_room_hold_token', 'token'),
+    )
+
+# Materialized dashboard aggregates, updated in the same transaction as the
+# booking writes so the dashboard never scans booking history
+class BookingStats(db.Model):
+    __tablename__ = 'booking_stats'
+    id = db.Column(db.Integer, primary_key=True)  # Single row, id 1
+    total_bookings = db.Column(db.Integer, nullable=False, default=0)
+    pending_bookings = db.Column(db.Integer, nullable=False, default=0)
+    total_revenue = db.Column(db.Float, nullable=False, default=0)  # Pending + confirmed
+
+# Per-day rollup keyed by the date bookings were made
+class DailyBookingStats(db.Model):
+    __tablename__ = 'daily_booking_stats'
+    day = db.Column(db.Date, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)  # Pending + confirmed
+
+# Local copy of a room image URL: resized JPEG and WebP variants stored under
+# MEDIA_ROOT/<digest>/ by the media pipeline (media.py)
+class MediaAsset(db.Model):
+    __tablename__ = 'media_asset'
+    id = db.Column(db.Integer, primary_key=True)
+    source_url = db.Column(db.String(500), unique=True, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, ready, failed
+    digest = db.Column(db.String(64))  # Content hash of the original, names its directory
+    width = db.Column(db.Integer)  # Original size
+    height = db.Column(db.Integer)
+    widths = db.Column(JSONList)  # Variant widths rendered
+    error = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Counters every worker must agree on, such as the room catalog generation
+# (cache.DatabaseBackend, used when no Redis is configured)
+class CacheCounter(db.Model):
+    __tablename__ = 'cache_counter'
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class Admin(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    password_hash = db.Column(db.String(200), nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def sync_room_amenities(room):
+    """Mirror room.amenities into the room_amenity table"""
+    wanted = {str(amenity)[:100] for amenity in room.amenities or []}
+    current = {row.amenity: row for row in room.amenity_rows}
+    for amenity, row in current.items():
+        if amenity not in wanted:
+            room.amenity_rows.remove(row)
+    for amenity in wanted - set(current):
+        room.amenity_rows.append(RoomAmenity(amenity=amenity))
@@ -0,0 +1,275 @@
+"""Opt-in request profiling for the Flask app.
+
+When enabled, every request records its wall time, the number and total time
+of SQL statements (SQLAlchemy engine events), template render time and its
+slowest statements. The numbers are sent back in a Server-Timing header and
+aggregated into Prometheus text metrics served at /metrics (per worker).
+
+With a dump directory configured, a sampling profiler also walks the stacks
+of in-flight requests every few milliseconds and keeps folded stacks
+(flamegraph.pl / speedscope format) for the slowest N requests seen so far.
+"""
+import heapq
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from flask import Response, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+# Statements kept per request, slowest first
+SLOWEST_STATEMENTS = 5
+
+
+class RequestProfile:
+    """Timings collected while one request is being served"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = None
+        self.status = 500
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_starts = []
+        self.statements = []  # min-heap of (seconds, statement)
+        self.stacks = {}  # folded stack -> samples
+
+    def record_sql(self, statement, elapsed):
+        self.sql_count += 1
+        self.sql_time += elapsed
+        entry = (elapsed, ' '.join(statement.split()))
+        if len(self.statements) < SLOWEST_STATEMENTS:
+            heapq.heappush(self.statements, entry)
+        else:
+            heapq.heappushpop(self.statements, entry)
+
+    def slowest_statements(self):
+        return [
+            {'ms': round(elapsed * 1000, 3), 'statement': statement}
+            for elapsed, statement in sorted(self.statements, reverse=True)
+        ]
+
+    def server_timing(self):
+        return ', '.join([
+            f'app;dur={self.duration * 1000:.1f}',
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.sql_count} statements"',
+            f'tpl;dur={self.template_time * 1000:.1f}'
+        ])
+
+
+class Metrics:
+    """Per-endpoint counters and a duration histogram in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}  # (endpoint, method, status) -> count
+        self._durations = {}  # (endpoint, method) -> [bucket counts..., sum, count]
+        self._totals = {}  # (endpoint, method) -> [sql statements, sql seconds, template seconds]
+
+    def observe(self, endpoint, method, profile):
+        key = (endpoint, method)
+        with self._lock:
+            status_key = (endpoint, method, str(profile.status))
+            self._requests[status_key] = self._requests.get(status_key, 0) + 1
+
+            histogram = self._durations.setdefault(key, [0] * len(DURATION_BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if profile.duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += profile.duration
+            histogram[-1] += 1
+
+            totals = self._totals.setdefault(key, [0, 0.0, 0.0])
+            totals[0] += profile.sql_count
+            totals[1] += profile.sql_time
+            totals[2] += profile.template_time
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines += ['# HELP hotel_http_requests_total Requests served',
+                      '# TYPE hotel_http_requests_total counter']
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f'hotel_http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+            lines += ['# HELP hotel_http_request_duration_seconds Request wall time',
+                      '# TYPE hotel_http_request_duration_seconds histogram']
+            for (endpoint, method), histogram in sorted(self._durations.items()):
+                labels = f'endpoint="{endpoint}",method="{method}"'
+                for bound, count in zip(DURATION_BUCKETS, histogram):
+                    lines.append(f'hotel_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'hotel_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram[-1]}')
+                lines.append(f'hotel_http_request_duration_seconds_sum{{{labels}}} {histogram[-2]:.6f}')
+                lines.append(f'hotel_http_request_duration_seconds_count{{{labels}}} {histogram[-1]}')
+
+            for index, (name, help_text) in enumerate([
+                ('hotel_sql_statements_total', 'SQL statements executed'),
+                ('hotel_sql_duration_seconds_total', 'Time spent executing SQL'),
+                ('hotel_template_render_seconds_total', 'Time spent rendering templates')
+            ]):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for (endpoint, method), totals in sorted(self._totals.items()):
+                    value = totals[index] if index == 0 else f'{totals[index]:.6f}'
+                    lines.append(f'{name}{{endpoint="{endpoint}",method="{method}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class StackSampler:
+    """Samples the stacks of threads serving requests and keeps the slowest N"""
+
+    def __init__(self, dump_dir, keep, interval):
+        self.dump_dir = dump_dir
+        self.keep = keep
+        self.interval = interval
+        self._slowest = []  # min-heap of (duration, seq, file stem)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        os.makedirs(dump_dir, exist_ok=True)
+
+    def start(self, active):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(active,), daemon=True)
+                self._thread.start()
+
+    def _run(self, active):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for ident, profile in list(active.items()):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                if stack:
+                    folded = ';'.join(reversed(stack))
+                    profile.stacks[folded] = profile.stacks.get(folded, 0) + 1
+
+    def offer(self, profile, method, path, endpoint):
+        """Write the request's stacks if it is among the slowest seen"""
+        with self._lock:
+            if len(self._slowest) >= self.keep and profile.duration <= self._slowest[0][0]:
+                return
+            self._seq += 1
+            stem = f'{int(profile.duration * 1000):06d}ms-{re.sub(r"[^A-Za-z0-9_]", "_", endpoint)}-{self._seq}'
+            entry = (profile.duration, self._seq, stem)
+            evicted = heapq.heappushpop(self._slowest, entry) if len(self._slowest) >= self.keep else None
+            if evicted is None:
+                heapq.heappush(self._slowest, entry)
+
+        base = os.path.join(self.dump_dir, stem)
+        with open(base + '.folded', 'w', encoding='utf-8') as f:
+            for folded, samples in sorted(profile.stacks.items()):
+                f.write(f'{folded} {samples}\n')
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'method': method,
+                'path': path,
+                'endpoint': endpoint,
+                'status': profile.status,
+                'ms': round(profile.duration * 1000, 3),
+                'sql_statements': profile.sql_count,
+                'sql_ms': round(profile.sql_time * 1000, 3),
+                'template_ms': round(profile.template_time * 1000, 3),
+                'slowest_statements': profile.slowest_statements()
+            }, f, indent=2)
+        if evicted is not None:
+            for suffix in ('.folded', '.json'):
+                try:
+                    os.remove(os.path.join(self.dump_dir, evicted[2] + suffix))
+                except OSError:
+                    pass
+
+
+def init_profiling(app):
+    """Instrument app; call once at startup when PROFILING is enabled"""
+    active = {}  # thread ident -> RequestProfile
+    metrics = Metrics()
+    sampler = None
+    if app.config.get('PROFILING_DUMP_DIR'):
+        sampler = StackSampler(
+            app.config['PROFILING_DUMP_DIR'],
+            keep=app.config.get('PROFILING_SLOWEST', 10),
+            interval=app.config.get('PROFILING_INTERVAL_MS', 5) / 1000
+        )
+    slow_ms = app.config.get('PROFILING_SLOW_MS', 500)
+
+    def current_profile():
+        return active.get(threading.get_ident())
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._profiling_started = time.perf_counter()
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = current_profile()
+        started = getattr(context, '_profiling_started', None)
+        if profile is not None and started is not None:
+            profile.record_sql(statement, time.perf_counter() - started)
+
+    @before_render_template.connect_via(app)
+    def template_started(sender, template, context, **extra):
+        profile = current_profile()
+        if profile is not None:
+            profile.template_starts.append(time.perf_counter())
+
+    @template_rendered.connect_via(app)
+    def template_finished(sender, template, context, **extra):
+        profile = current_profile()
+        if profile is not None and profile.template_starts:
+            profile.template_time += time.perf_counter() - profile.template_starts.pop()
+
+    @app.before_request
+    def start_profile():
+        if sampler is not None:
+            sampler.start(active)
+        active[threading.get_ident()] = RequestProfile()
+
+    @app.after_request
+    def add_server_timing(response):
+        profile = current_profile()
+        if profile is not None:
+            profile.status = response.status_code
+            profile.duration = time.perf_counter() - profile.started
+            response.headers['Server-Timing'] = profile.server_timing()
+        return response
+
+    @app.teardown_request
+    def finish_profile(exc):
+        profile = active.pop(threading.get_ident(), None)
+        if profile is None:
+            return
+        if profile.duration is None:  # Unhandled exception, after_request skipped
+            profile.duration = time.perf_counter() - profile.started
+        endpoint = request.endpoint or 'unmatched'
+        if endpoint == 'metrics':
+            return
+        metrics.observe(endpoint, request.method, profile)
+
+        if profile.duration * 1000 >= slow_ms:
+            app.logger.warning(
+                'Slow request %s %s: %.1f ms, %d SQL statements (%.1f ms), templates %.1f ms, slowest: %s',
+                request.method, request.path, profile.duration * 1000, profile.sql_count,
+                profile.sql_time * 1000, profile.template_time * 1000, profile.slowest_statements()[:1]
+            )
+        if sampler is not None:
+            sampler.offer(profile, request.method, request.path, endpoint)
+
+    @app.route('/metrics', endpoint='metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return metrics
@@ -0,0 +1,122 @@
+"""Multi-property routing: one database per hotel property.
+
+PROPERTIES maps property keys to database URLs (one SQLite file each, or a
+Postgres database/schema each). Every request picks one property and all of
+its queries go to that property's engine, so availability checks, admin
+views and booking writes only ever touch one shard and SQLite write locks
+are per property.
+
+A request's property comes from, in order: its host (PROPERTY_HOSTS), a
+`property` query argument (remembered in the session), an X-Property header,
+the property remembered in the session, and DEFAULT_PROPERTY. Without
+PROPERTIES the app runs single-property on SQLALCHEMY_DATABASE_URI and none
+of this is active.
+"""
+import threading
+from contextlib import contextmanager
+
+from flask import abort, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+
+# Header a reverse proxy or API client can set instead of the query argument
+PROPERTY_HEADER = 'X-Property'
+
+
+def current_property():
+    """Key of the property the current request or use_property block is for (None when single)"""
+    return g.get('property') if has_app_context() else None
+
+
+class PropertySession(Session):
+    """Session that sends every statement to the current property's engine"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            key = current_property()
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class PerProperty:
+    """One instance of an object per property, picked by the current request.
+
+    Attribute access is forwarded, so a per-property cache is used exactly
+    like a single one.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def current(self):
+        key = current_property()
+        instance = self._instances.get(key)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.setdefault(key, self._factory(key))
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
+
+
+def property_keys(app):
+    """Every configured property, or [None] for the single database"""
+    return list(app.config['PROPERTIES']) or [None]
+
+
+def selected_properties(app, requested=None):
+    """Properties a maintenance script works on: the requested one, or every property"""
+    return [requested] if requested else property_keys(app)
+
+
+def property_label(key):
+    return f" [{key}]" if key else ''
+
+
+@contextmanager
+def use_property(db, key):
+    """Run a block (CLI command, background job) against one property's database"""
+    previous = g.get('property')
+    db.session.remove()
+    g.property = key
+    try:
+        yield
+    finally:
+        db.session.remove()
+        g.property = previous
+
+
+def resolve_property(config, host, requested=None, remembered=lambda: None):
+    """(property key, source) for a request, or (None, 'unknown') for an unknown requested key.
+
+    remembered returns the key kept in the session; it is only called when
+    needed, so host-routed responses do not vary on the cookie.
+    """
+    properties = config['PROPERTIES']
+    key = config['PROPERTY_HOSTS'].get((host or '').split(':')[0].lower())
+    if key in properties:
+        return key, 'host'
+    if requested:
+        return (requested, 'request') if requested in properties else (None, 'unknown')
+    key = remembered()
+    if key in properties:
+        return key, 'session'
+    return config['DEFAULT_PROPERTY'], 'default'
+
+
+def init_properties(app):
+    """Pick each request's property; call once at startup when PROPERTIES is set"""
+
+    @app.before_request
+    def select_property():
+        requested = request.args.get('property') or request.headers.get(PROPERTY_HEADER)
+        key, source = resolve_property(app.config, request.host, requested, lambda: session.get('property'))
+        if key is None:
+            abort(404)
+        if request.args.get('property'):
+            session['property'] = key  # Keeps the choice for the following pages
+        g.property = key
+        g.property_source = source
@@ -0,0 +1,153 @@
+"""Room combination search: the cheapest ways to seat a party for one stay.
+
+Works on room types whose free units for the stay are already known (one
+ledger query in app.py). Rather than probing combinations of room types,
+the search first lists capacity signatures, i.e. multisets of per-room
+capacities that seat the party with no unneeded room, then fills each
+signature with the cheapest free units of each capacity. Every combination
+is scored in one pass; no extra database work is needed.
+"""
+import heapq
+
+
+def capacity_signatures(capacities, guests, max_rooms):
+    """Non-increasing capacity tuples that seat guests, minimal (no spare room)"""
+    capacities = sorted(set(capacities), reverse=True)
+    signatures = []
+
+    def extend(start, chosen, seated):
+        if seated >= guests:
+            # The last (smallest) room was needed, so the signature is minimal
+            signatures.append(tuple(chosen))
+            return
+        if len(chosen) == max_rooms:
+            return
+        for i in range(start, len(capacities)):
+            if seated + capacities[i] * (max_rooms - len(chosen)) < guests:
+                break  # Smaller capacities cannot catch up either
+            chosen.append(capacities[i])
+            extend(i, chosen, seated + capacities[i])
+            chosen.pop()
+
+    extend(0, [], 0)
+    return signatures
+
+
+def cheapest_picks(room_types, count, limit):
+    """Up to limit best (nightly cost, beds, room ids) picks of count units.
+
+    room_types are (price, capacity, room_id, free units), sorted, so types
+    of one price come fewest beds first. A pick is a non-decreasing tuple of
+    positions in that list, expanded best first (cheapest, then fewest beds)
+    from the count first units by moving one unit to the next room type, so
+    each room mix is met once and only about limit * count are looked at.
+    """
+    start = []
+    for position, (_, _, _, free) in enumerate(room_types):
+        start += [position] * min(free, count - len(start))
+    if len(start) < count:
+        return []
+    start = tuple(start)
+    heap = [(
+        sum(room_types[position][0] for position in start), sum(room_types[position][1] for position in start), start
+    )]
+    seen = {start}
+    picks = []
+    while heap and len(picks) < limit:
+        cost, beds, positions = heapq.heappop(heap)
+        picks.append((cost, beds, tuple(room_types[position][2] for position in positions)))
+        for i, position in enumerate(positions):
+            # Move the last unit taken from this room type to the next one
+            if i + 1 < count and positions[i + 1] == position or position + 1 == len(room_types):
+                continue
+            successor = positions[:i] + (position + 1,) + positions[i + 1:]
+            if successor.count(position + 1) > room_types[position + 1][3] or successor in seen:
+                continue
+            seen.add(successor)
+            current, following = room_types[position], room_types[position + 1]
+            heapq.heappush(heap, (
+                cost - current[0] + following[0], beds - current[1] + following[1], successor
+            ))
+    return picks
+
+
+def merge_cheapest(left, right, limit):
+    """The limit best pairings of two best-first (cost, beds, room ids) lists"""
+    if not left or not right:
+        return []
+    heap = [(left[0][0] + right[0][0], left[0][1] + right[0][1], 0, 0)]
+    seen = {(0, 0)}
+    merged = []
+    while heap and len(merged) < limit:
+        cost, beds, i, j = heapq.heappop(heap)
+        merged.append((cost, beds, left[i][2] + right[j][2]))
+        for a, b in ((i + 1, j), (i, j + 1)):
+            if a < len(left) and b < len(right) and (a, b) not in seen:
+                seen.add((a, b))
+                heapq.heappush(heap, (left[a][0] + right[b][0], left[a][1] + right[b][1], a, b))
+    return merged
+
+
+def search_combinations(rooms, available, guests, nights, max_rooms=4, limit=10, max_price=None):
+    """Ranked room combinations that seat guests for nights nights.
+
+    rooms are catalog rooms, available maps room id to free units for the
+    stay. Returns dicts with the total price, nightly price, room count,
+    spare beds and per-room-type items ({'room', 'quantity', 'guests'} with
+    guests per room), cheapest first, then fewest rooms, then fewest spare beds.
+    """
+    by_id = {room.id: room for room in rooms}
+
+    # Room types with free units per effective capacity (a room never seats
+    # more than the party); within one, equal prices are ranked by real beds
+    types_by_capacity = {}
+    for room in rooms:
+        free = min(available.get(room.id, 0), max_rooms)
+        if free <= 0 or not room.capacity:
+            continue
+        capacity = min(room.capacity, guests)
+        types_by_capacity.setdefault(capacity, []).append((room.price, room.capacity, room.id, free))
+    for room_types in types_by_capacity.values():
+        room_types.sort()
+
+    picks = {}
+    found = []
+    for signature in capacity_signatures(types_by_capacity, guests, max_rooms):
+        needed = {}
+        for capacity in signature:
+            needed[capacity] = needed.get(capacity, 0) + 1
+        # Cheapest picks per capacity, merged pairwise keeping only the best
+        merged = [(0, 0, ())]
+        for capacity, count in needed.items():
+            key = (capacity, count)
+            if key not in picks:
+                picks[key] = cheapest_picks(types_by_capacity[capacity], count, limit)
+            merged = merge_cheapest(merged, picks[key], limit)
+        for nightly, beds, room_ids in merged:  # Empty when a capacity has too few free units
+            if max_price is not None and nightly * nights > max_price:
+                break
+            found.append((nightly, len(room_ids), beds - guests, room_ids))
+
+    return [combination_result(by_id, guests, nights, *entry) for entry in heapq.nsmallest(limit, found)]
+
+
+def combination_result(by_id, guests, nights, nightly, room_count, spare, room_ids):
+    # Seat the party largest rooms first
+    quantities, seated = {}, {}
+    remaining = guests
+    for room_id in sorted(room_ids, key=lambda room_id: -by_id[room_id].capacity):
+        placed = min(by_id[room_id].capacity, remaining)
+        remaining -= placed
+        quantities[room_id] = quantities.get(room_id, 0) + 1
+        seated[room_id] = max(seated.get(room_id, 0), placed)
+
+    return {
+        'total_price': round(nightly * nights, 2),
+        'price_per_night': round(nightly, 2),
+        'rooms_count': room_count,
+        'spare_beds': spare,
+        'items': [
+            {'room': by_id[room_id], 'quantity': quantity, 'guests': seated[room_id]}
+            for room_id, quantity in quantities.items()
+        ]
+    }
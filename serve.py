@@ -0,0 +1,71 @@
+"""Production launcher: the app under Gunicorn with several worker processes.
+
+Usage:
+    python serve.py [--workers N] [--threads 1] [--bind 0.0.0.0:8000]
+
+Settings come from config.Config (DATABASE_URL, DB_POOL_SIZE, SQLITE_* ...).
+Workers default to WEB_CONCURRENCY or 2 x CPUs + 1. The app is built, tables
+are created, templates compiled and CSS/JS bundles built once in the master
+process, then frozen out of garbage collection (gc.freeze) so forked workers
+keep sharing that memory; each worker starts with its own connection pool.
+Needs gunicorn from requirements.txt (Linux/macOS).
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import sys
+
+
+def default_workers():
+    return int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1)
+
+
+def post_fork(server, worker):
+    """Drop pooled connections inherited from the master, they must not be shared"""
+    from models import db
+    app = worker.app.wsgi()  # The app serve() built before forking
+    with app.app_context():
+        for engine in db.engines.values():  # Every property's engine
+            engine.dispose(close=False)
+
+
+def serve(bind, workers, threads):
+    from gunicorn.app.base import BaseApplication  # optional dependency, production only
+    from app import create_app, create_tables, precompile_templates
+
+    app = create_app()
+    with app.app_context():
+        create_tables()
+    precompile_templates(app)  # Workers fork with compiled templates, and the bytecode cache is warm
+    app.extensions['hotel'].assets.build()  # Hashed CSS/JS bundles of the current sources
+    # Keep everything built so far out of the workers' collections: scanning it
+    # would touch every object and copy the master's memory into each worker
+    gc.freeze()
+
+    class HotelApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', bind)
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('post_fork', post_fork)
+            self.cfg.set('accesslog', os.environ.get('ACCESS_LOG'))
+
+        def load(self):
+            return app
+
+    HotelApplication().run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the hotel app with Gunicorn')
+    parser.add_argument('--bind', default=os.environ.get('BIND', '0.0.0.0:8000'))
+    parser.add_argument('--workers', type=int, default=default_workers())
+    parser.add_argument('--threads', type=int, default=1, help='threads per worker')
+    args = parser.parse_args(argv)
+    serve(args.bind, args.workers, args.threads)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
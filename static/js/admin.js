@@ -252,4 +252,100 @@ function initializeCharts() {
     console.log('Charts initialized');
 }
 
-console.log('%c👨‍💼 Admin Panel Loaded', 'color: #667eea; font-size: 16px; font-weight: bold;');
\ No newline at end of file
+console.log('%c👨‍💼 Admin Panel Loaded', 'color: #667eea; font-size: 16px; font-weight: bold;');
+// Booking list: fetch the next keyset page and append its rows
+let loadingBookings = false;
+
+async function loadMoreBookings() {
+    const button = document.getElementById('loadMoreBookings');
+    if (!button || loadingBookings || !button.dataset.cursor) return;
+    
+    loadingBookings = true;
+    button.disabled = true;
+    
+    const params = new URLSearchParams(window.location.search);
+    params.set('cursor', button.dataset.cursor);
+    
+    try {
+        const response = await fetch(`/admin/bookings.json?${params.toString()}`);
+        const data = await response.json();
+        const tbody = document.getElementById('bookingsTableBody');
+        
+        data.bookings.forEach(booking => {
+            bookingsData[booking.id] = booking;
+            tbody.insertAdjacentHTML('beforeend', renderBookingRow(booking));
+        });
+        
+        if (data.next_cursor) {
+            button.dataset.cursor = data.next_cursor;
+            button.disabled = false;
+        } else {
+            button.parentElement.remove();
+        }
+    } catch (error) {
+        console.error('Error loading bookings:', error);
+        button.disabled = false;
+    } finally {
+        loadingBookings = false;
+    }
+}
+
+function renderBookingRow(booking) {
+    let rooms = 'N/A';
+    if (booking.is_multi_room) {
+        rooms = `${booking.items.length} room(s)`;
+    } else if (booking.room) {
+        rooms = escapeHtml(booking.room.name);
+    }
+    
+    const statuses = ['pending', 'confirmed', 'cancelled'].map(status =>
+        `<option value="${status}" ${booking.status === status ? 'selected' : ''}>${status.charAt(0).toUpperCase() + status.slice(1)}</option>`
+    ).join('');
+    
+    return `
+        <tr>
+            <td>#${booking.id}</td>
+            <td>
+                <div class="guest-info">
+                    <strong>${escapeHtml(booking.guest_name)}</strong><br>
+                    <small>${escapeHtml(booking.guest_email)}</small><br>
+                    <small>${escapeHtml(booking.guest_phone)}</small>
+                </div>
+            </td>
+            <td>${rooms}</td>
+            <td>${booking.check_in}</td>
+            <td>${booking.check_out}</td>
+            <td><strong>$${booking.total_price.toFixed(2)}</strong></td>
+            <td>
+                <form action="/admin/booking/update/${booking.id}" method="POST" class="inline-form">
+                    <select name="status" onchange="this.form.submit()" class="status-select status-${booking.status}">
+                        ${statuses}
+                    </select>
+                </form>
+            </td>
+            <td>
+                <div class="action-buttons">
+                    <button onclick="viewBookingDetails(${booking.id})" class="btn-icon btn-info" title="View Details">
+                        <i class="fas fa-eye"></i>
+                    </button>
+                    <button onclick="deleteBooking(${booking.id}, ${escapeHtml(JSON.stringify(booking.guest_name))})" class="btn-icon btn-delete" title="Delete">
+                        <i class="fas fa-trash"></i>
+                    </button>
+                </div>
+            </td>
+        </tr>
+    `;
+}
+
+// Load the next page automatically when the button scrolls into view
+document.addEventListener('DOMContentLoaded', function() {
+    const button = document.getElementById('loadMoreBookings');
+    if (button && 'IntersectionObserver' in window) {
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadMoreBookings();
+            }
+        });
+        observer.observe(button);
+    }
+});
@@ -0,0 +1,149 @@
+"""Login and hold throttling: token-bucket rate limits and a bounded pool for password hashing.
+
+Every admin login attempt takes a token from a bucket for the client IP and
+one for the username. Buckets refill at a steady rate up to their burst
+size, so a few typos never lock anyone out while a credential-stuffing run
+is cut down to the refill rate. Buckets live in process memory, or in Redis
+(CACHE_REDIS_URL) so that every worker enforces one shared limit. The
+same buckets limit how many room holds a client IP creates (app.py).
+
+Password hashes are checked on a small thread pool with a bounded queue.
+Hashing releases the GIL, so at most a fixed number of hashes burn CPU per
+worker at any time; attempts beyond the queue are turned away at once
+instead of piling up behind each other and starving booking requests.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LocalBuckets:
+    """Token buckets kept in this process, the least recently used dropped past max_keys"""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key, burst, per_second):
+        """Take one token; returns 0 when allowed, else seconds until one is free"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / per_second
+
+
+# Refill, take and store in one round trip, on Redis' clock so workers agree
+TAKE_SCRIPT = """
+local burst, per_second = tonumber(ARGV[1]), tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+tokens = math.min(burst, tokens + (now - (tonumber(state[2]) or now)) * per_second)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / per_second) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker through Redis"""
+
+    def __init__(self, url, prefix='hotel:'):
+        import redis  # optional dependency, only needed for shared limits
+        self._take = redis.Redis.from_url(url).register_script(TAKE_SCRIPT)
+        self._prefix = prefix
+
+    def take(self, key, burst, per_second):
+        allowed, tokens = self._take(keys=[self._prefix + 'bucket:' + key], args=[burst, per_second])
+        return 0 if allowed else (1 - float(tokens)) / per_second
+
+
+def make_buckets(redis_url=None, prefix='hotel:'):
+    """Shared Redis buckets when a URL is configured, else process-local"""
+    if redis_url:
+        return RedisBuckets(redis_url, prefix)
+    return LocalBuckets()
+
+
+class PoolBusy(Exception):
+    """Raised when the hashing pool and its queue are full"""
+
+
+class BoundedPool:
+    """Thread pool that refuses work past workers + queue_size pending calls"""
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def run(self, fn, *args):
+        """fn(*args) on the pool, waiting for its result; raises PoolBusy when full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolBusy()
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def _pool(self):
+        # Created on first use, so a server that forks after building the app
+        # starts the threads in each worker rather than in the master
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+            return self._executor
+
+
+class LoginThrottle:
+    """Per-IP and per-username login limits plus the password hashing pool"""
+
+    def __init__(self, buckets, ip_burst, ip_per_minute, user_burst, user_per_minute, hash_workers, hash_queue):
+        self.buckets = buckets
+        self.limits = {
+            'ip': (ip_burst, ip_per_minute / 60),
+            'user': (user_burst, user_per_minute / 60)
+        }
+        self.hashing = BoundedPool(hash_workers, hash_queue)
+        self.limited = 0
+
+    def attempt(self, ip, username):
+        """Take a token for the IP and the username; returns 0 or whole seconds to wait"""
+        waits = [
+            self.buckets.take(f'login:{scope}:{key}', *self.limits[scope])
+            for scope, key in (('ip', ip or '-'), ('user', username.strip().lower()[:80]))
+        ]
+        wait = max(waits)
+        if wait:
+            self.limited += 1
+        return int(wait) + 1 if wait else 0
+
+    def check_password(self, check, password_hash, password):
+        """check(password_hash, password) on the bounded pool; raises PoolBusy"""
+        return self.hashing.run(check, password_hash, password)
+
+    def stats(self):
+        return {
+            'limited_attempts': self.limited,
+            'hash_rejections': self.hashing.rejected,
+            'hash_workers': self.hashing.workers
+        }